@@ -0,0 +1,71 @@
+# Cron expansion: compiled expressions vs. minute by minute matching.
+#
+# The naive expander walks every minute of the window and tests it
+# against the parsed fields, the compiled one only visits matching days
+# and yields their precomputed times. Both must produce the same list.
+#
+# Run from the workout-api directory, no database needed:
+#   python -m benchmarks.bench_cron
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from services.cron import parse_cron
+
+
+CASES = [
+    ("* * * * *", 365),
+    ("*/5 9-17 * * 1-5", 365),
+    ("0 7 * * 1,3,5", 3650),
+    ("30 6 1,15 * *", 3650),
+]
+
+
+def naive_occurrences(expression, start, end):
+    cron = parse_cron(expression)
+    minute = timedelta(minutes=1)
+    when = start
+    while when < end:
+        if (when.minute in cron.minutes and when.hour in cron.hours
+                and cron.matches_day(when.date())):
+            yield when
+        when += minute
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = list(function())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run(repeat):
+    start = datetime(2024, 1, 1)
+    results = []
+    for expression, days in CASES:
+        end = start + timedelta(days=days)
+        compiled, compiled_seconds = timed(
+            lambda: parse_cron(expression).occurrences(start, end), repeat)
+        naive, naive_seconds = timed(
+            lambda: naive_occurrences(expression, start, end), 1)
+        assert compiled == naive, expression
+        results.append({
+            "expression": expression,
+            "days": days,
+            "occurrences": len(compiled),
+            "naive_ms": round(naive_seconds * 1000, 2),
+            "compiled_ms": round(compiled_seconds * 1000, 2),
+            "speedup": round(naive_seconds / compiled_seconds, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=2))
@@ -0,0 +1,115 @@
+# Concurrent logins vs. unrelated requests.
+#
+# Fires --logins concurrent /auth/token requests and, while they are in
+# flight, keeps probing a cheap endpoint. With hashing on the event loop
+# the probes wait behind every bcrypt call, with the hashing executor they
+# are answered right away.
+#
+# Run from the workout-api directory against a configured database:
+#   python -m benchmarks.bench_login_concurrency
+#   python -m benchmarks.bench_login_concurrency --inline  # old behaviour
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+import httpx
+
+import main
+from routes import auth
+
+
+PROBE_PATH = "/exercise/exercise_types/"
+
+
+# Hashes on the event loop, like the handlers did before the executor
+class InlineHasher:
+    async def hash(self, password):
+        return auth.bcrypt_context.hash(password)
+
+    async def verify(self, password, hashed_password):
+        return auth.bcrypt_context.verify(password, hashed_password)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def probe(client, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(PROBE_PATH)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def run(logins, inline):
+    if inline:
+        auth.password_hasher = InlineHasher()
+
+    transport = httpx.ASGITransport(app=main.app)
+    # ASGITransport does not send lifespan events, run startup here
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        username = f"bench{uuid.uuid4().hex[:12]}"
+        password = "benchmark-password"
+        response = await client.post(
+            "/auth/register",
+            json={"username": username, "password": password},
+        )
+        response.raise_for_status()
+
+        # Warm up the catalog and the connection pool
+        await client.get(PROBE_PATH)
+
+        idle = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await task
+
+        busy = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, busy))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post(
+                "/auth/token",
+                data={"username": username, "password": password},
+            )
+            for _ in range(logins)
+        ))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await task
+
+    return {
+        "mode": "inline" if inline else "executor",
+        "logins": logins,
+        "login_status": {
+            str(code): sum(1 for r in responses if r.status_code == code)
+            for code in {r.status_code for r in responses}
+        },
+        "login_wall_seconds": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 1),
+        "probe_idle_p50_ms": round(statistics.median(idle), 2),
+        "probe_busy_p50_ms": round(statistics.median(busy), 2),
+        "probe_busy_p95_ms": round(percentile(busy, 95), 2),
+        "probe_busy_max_ms": round(max(busy), 2),
+        "probe_busy_count": len(busy),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--inline", action="store_true",
+                        help="hash on the event loop for comparison")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.logins, args.inline)), indent=2))
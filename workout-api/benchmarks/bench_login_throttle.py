@@ -0,0 +1,66 @@
+# Login throttle overhead on the accept path.
+#
+# Times LoginThrottle.check for attempts that are let through, spread over
+# --keys usernames and client IPs so every check touches two counters,
+# next to one bcrypt verify, the work every accepted login does anyway.
+# With --url the counters live in that Redis protocol server instead.
+#
+# Run from the workout-api directory, no database needed:
+#   python -m benchmarks.bench_login_throttle
+#   python -m benchmarks.bench_login_throttle --url redis://localhost:6379
+import argparse
+import asyncio
+import json
+import time
+
+from passlib.context import CryptContext
+
+from services import LoginThrottle, MemoryCounters, RedisCounters
+
+
+async def time_checks(throttle, attempts, keys):
+    started = time.perf_counter()
+    for attempt in range(attempts):
+        key = attempt % keys
+        await throttle.check(username=f"user{key}", ip=f"10.0.{key}")
+    return time.perf_counter() - started
+
+
+async def run(attempts, keys, url):
+    counters = RedisCounters(url) if url else MemoryCounters(keys * 2)
+    # Limits high enough that every attempt is accepted
+    throttle = LoginThrottle(
+        counters, 60, {"username": attempts, "ip": attempts})
+    try:
+        seconds = await time_checks(throttle, attempts, keys)
+    finally:
+        await throttle.close()
+    assert throttle.rejected == 0 and throttle.errors == 0
+
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    hashed = context.hash("secret1")
+    started = time.perf_counter()
+    context.verify("secret1", hashed)
+    verify_seconds = time.perf_counter() - started
+
+    check_us = seconds / attempts * 1e6
+    return {
+        "counters": counters.name,
+        "attempts": attempts,
+        "keys": keys,
+        "check_us": round(check_us, 2),
+        "checks_per_second": round(attempts / seconds),
+        "bcrypt_verify_ms": round(verify_seconds * 1000, 2),
+        "overhead_percent_of_verify": round(
+            check_us / (verify_seconds * 1e6) * 100, 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--attempts", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--url", default="")
+    args = parser.parse_args()
+    print(json.dumps(
+        asyncio.run(run(args.attempts, args.keys, args.url)), indent=2))
@@ -0,0 +1,138 @@
+# Response serialization: jsonable_encoder + JSONResponse vs. response
+# models + ORJSONResponse.
+#
+# The old path is what FastAPI does for an endpoint without a response
+# model, jsonable_encoder walks the payload in Python before json.dumps.
+# The new path is what it does with one: pydantic-core validates and dumps
+# the payload and orjson renders it. Both bodies must decode to the same
+# json.
+#
+# Run from the workout-api directory, no database needed:
+#   python -m benchmarks.bench_serialization
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from form_models import HistoryEntryModel, PersonalGoalsResponse
+from models import User_History
+from routes.history_routes import history_payload
+
+
+def goals_payload(count):
+    started = datetime(2024, 1, 1)
+    exercise = {
+        "exercise_id": 1,
+        "exercise_name": "Running",
+        "description": "Steady pace running outdoors or on a treadmill.",
+        "instructions": "Keep a pace you can hold for the whole distance.",
+        "target_muscles": "Legs",
+        "difficulty": "Beginner",
+        "exercise_type_id": 1,
+        "unit_type_id": 2,
+        "goal_type_id": 2,
+        "unit_1": "km",
+        "unit_2": "min",
+    }
+    return {"user_goals": [
+        {
+            "goal_id": goal_id,
+            "goal_name": f"goal {goal_id}",
+            "user_id": 1,
+            "created_time": started,
+            "start_date": started,
+            "end_date": started + timedelta(days=90),
+            "range_min": 100,
+            "range_max": 200,
+            "selected_exercises": [
+                dict(exercise, exercise_id=exercise_id)
+                for exercise_id in range(1, 4)
+            ],
+            "completed": False,
+            "goal_type_id": 2,
+            "goal_target": "Distance",
+            "progress_value": goal_id * 1.5,
+            "progress_percent": 42.5,
+            "projected_completion": started + timedelta(days=60),
+        }
+        for goal_id in range(1, count + 1)
+    ]}
+
+
+def history_rows(count):
+    started = datetime(2024, 1, 1)
+    return [
+        User_History(
+            history_id=history_id,
+            user_id=1,
+            created=started + timedelta(hours=history_id),
+            weight_change=80 + history_id % 5,
+            bmi_calculation=24 if history_id % 3 == 0 else None,
+        )
+        for history_id in range(1, count + 1)
+    ]
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def run(goals, histories, repeat):
+    goals_adapter = TypeAdapter(PersonalGoalsResponse)
+    history_adapter = TypeAdapter(List[HistoryEntryModel])
+    goals = goals_payload(goals)
+    histories = history_rows(histories)
+
+    cases = {
+        "personal_goals": (
+            lambda: JSONResponse(jsonable_encoder(goals)).body,
+            lambda: ORJSONResponse(goals_adapter.dump_python(
+                goals_adapter.validate_python(goals),
+                mode="json", by_alias=True)).body,
+            len(goals["user_goals"]),
+        ),
+        "history": (
+            lambda: JSONResponse(jsonable_encoder(
+                [history_payload(history) for history in histories])).body,
+            lambda: ORJSONResponse(history_adapter.dump_python(
+                history_adapter.validate_python(histories),
+                mode="json", by_alias=True, exclude_none=True)).body,
+            len(histories),
+        ),
+    }
+
+    results = []
+    for name, (old, new, items) in cases.items():
+        old_body, old_seconds = timed(old, repeat)
+        new_body, new_seconds = timed(new, repeat)
+        assert json.loads(old_body) == json.loads(new_body), name
+        results.append({
+            "payload": name,
+            "items": items,
+            "bytes": len(new_body),
+            "jsonable_encoder_ms": round(old_seconds * 1000, 2),
+            "response_model_orjson_ms": round(new_seconds * 1000, 2),
+            "speedup": round(old_seconds / new_seconds, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--goals", type=int, default=1000)
+    parser.add_argument("--histories", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(
+        run(args.goals, args.histories, args.repeat), indent=2))
@@ -0,0 +1,123 @@
+# Workout set ingestion throughput.
+#
+# Writes --sets rows with each writer (multi-row INSERT and COPY) inside
+# a transaction that is rolled back, then pushes the same amount through
+# POST /workout_sets/batch as a json array and as NDJSON in batches of
+# --batch sets.
+#
+# Run from the workout-api directory against a configured database:
+#   python -m benchmarks.bench_workout_sets
+#   python -m benchmarks.bench_workout_sets --sets 100000 --batch 5000
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import select
+
+import main
+from database import AsyncSessionLocal
+from models import Exercise, User
+from services.workout_sets import copy_workout_sets, insert_workout_sets
+
+
+def synthetic_sets(count, exercise_ids):
+    started = datetime.utcnow() - timedelta(days=30)
+    return [
+        dict(
+            exercise_id=random.choice(exercise_ids),
+            performed_at=(started + timedelta(seconds=i)).isoformat(),
+            value_1=random.randint(1, 5),
+            value_2=random.randint(5, 20),
+            weight=round(random.uniform(10, 120), 1),
+        )
+        for i in range(count)
+    ]
+
+
+async def writer_rates(user_id, sets):
+    rows = [
+        (user_id, s["exercise_id"], None,
+         datetime.fromisoformat(s["performed_at"]),
+         s["value_1"], s["value_2"], s["weight"])
+        for s in sets
+    ]
+    rates = {}
+    for name, writer in (("insert", insert_workout_sets),
+                         ("copy", copy_workout_sets)):
+        best = None
+        # First round warms up connections and statement caches
+        for _ in range(3):
+            async with AsyncSessionLocal() as db:
+                started = time.perf_counter()
+                await writer(db, rows)
+                elapsed = time.perf_counter() - started
+                await db.rollback()
+            best = elapsed if best is None else min(best, elapsed)
+        rates[f"{name}_sets_per_second"] = round(len(rows) / best)
+    return rates
+
+
+async def endpoint_rate(client, headers, sets, batch, ndjson):
+    started = time.perf_counter()
+    for start in range(0, len(sets), batch):
+        chunk = sets[start:start + batch]
+        if ndjson:
+            response = await client.post(
+                "/workout_sets/batch",
+                content="".join(json.dumps(s) + "\n" for s in chunk),
+                headers={**headers, "Content-Type": "application/x-ndjson"},
+            )
+        else:
+            response = await client.post(
+                "/workout_sets/batch", json=chunk, headers=headers)
+        response.raise_for_status()
+    return round(len(sets) / (time.perf_counter() - started))
+
+
+async def run(count, batch):
+    transport = httpx.ASGITransport(app=main.app)
+    # ASGITransport does not send lifespan events, run startup here
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        username = f"bench{uuid.uuid4().hex[:12]}"
+        password = "benchmark-password"
+        response = await client.post(
+            "/auth/register",
+            json={"username": username, "password": password},
+        )
+        response.raise_for_status()
+        response = await client.post(
+            "/auth/token",
+            data={"username": username, "password": password},
+        )
+        headers = {
+            "Authorization": f"Bearer {response.json()['access_token']}"}
+
+        async with AsyncSessionLocal() as db:
+            user_id = await db.scalar(
+                select(User.user_id).where(User.username == username))
+            exercise_ids = (await db.scalars(
+                select(Exercise.exercise_id))).all()
+
+        sets = synthetic_sets(count, exercise_ids)
+        result = {"sets": count, "batch": batch}
+        result.update(await writer_rates(user_id, sets[:batch]))
+        result["json_sets_per_second"] = await endpoint_rate(
+            client, headers, sets, batch, ndjson=False)
+        result["ndjson_sets_per_second"] = await endpoint_rate(
+            client, headers, sets, batch, ndjson=True)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sets", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.sets, args.batch)), indent=2))
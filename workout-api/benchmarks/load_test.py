@@ -0,0 +1,636 @@
+# Load test of every router against a real server.
+#
+# Boots uvicorn on --port against DATABASE_URL (bootstrapped on startup
+# like any deployment), seeds a synthetic dataset under a per run username
+# prefix and drives the auth, user, exercise, goal, schedule, history and
+# workout set endpoints with --concurrency async clients for --duration
+# seconds (or --requests requests). Operations are picked from a weighted
+# mix, the data and the sequence of every client follow --seed.
+#
+# Latency is timed by the clients, queries per request come from the
+# server's /metrics before and after the run. /metrics is per worker, so
+# queries are only reported with --workers 1. The report is JSON, keep it
+# with --output to compare runs.
+#
+# Seeded rows are not removed, use a scratch database. Run from the
+# workout-api directory:
+#   python -m benchmarks.load_test
+#   python -m benchmarks.load_test --users 200 --concurrency 64 \
+#       --duration 120 --output before.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models import User, User_History
+from routes import auth
+
+
+PASSWORD = "load-test-password"
+CRONTABS = ("0 7 * * 1,3,5", "30 18 * * 2,4", "0 9 * * 6", "15 6 * * *",
+            "0 20 * * 0")
+HISTORY_DAYS = 730
+# /metrics needs the internal token, the server gets one for the run
+INTERNAL_TOKEN = os.environ.get("INTERNAL_API_TOKEN") or uuid.uuid4().hex
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def scrape_queries(client):
+    response = await client.get(
+        "/metrics", headers={"X-Internal-Token": INTERNAL_TOKEN})
+    response.raise_for_status()
+    return parse_queries(response.text)
+
+
+# Per route sums of the SQL histogram from a /metrics scrape
+def parse_queries(text):
+    totals = defaultdict(float)
+    pattern = re.compile(
+        r'^workout_api_request_(db_queries_sum|db_queries_count|'
+        r'db_seconds_total)\{method="([^"]*)",route="([^"]*)"\} (\S+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if match:
+            name, method, route, value = match.groups()
+            totals[(f"{method} {route}", name)] += float(value)
+    return totals
+
+
+class BenchUser:
+    def __init__(self, user_id, username):
+        self.id = user_id
+        self.username = username
+        token = auth.create_access_token(
+            username, user_id, timedelta(hours=12))
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.goal_ids = []
+        self.schedule_ids = []
+        self.history_ids = []
+        self.etags = {}
+
+
+class LoadTest:
+    def __init__(self, client):
+        self.client = client
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.exercises = {}
+
+    # label is "METHOD /route/template", the route that /metrics reports
+    async def request(self, label, method, url, user=None, **kwargs):
+        if user is not None:
+            kwargs["headers"] = dict(user.headers, **kwargs.get("headers", {}))
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status_code = response.status_code
+        except httpx.HTTPError:
+            response, status_code = None, "error"
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][status_code] += 1
+        return response
+
+    def goal_payload(self, rng):
+        goal_type_id = rng.choice(list(self.exercises))
+        range_min = rng.randint(1, 50)
+        now = datetime.utcnow()
+        return {
+            "goal_name": f"goal {rng.randint(1, 10 ** 6)}",
+            "start_date": (now - timedelta(
+                days=rng.randint(0, 180))).isoformat(),
+            "end_date": (now + timedelta(
+                days=rng.randint(30, 365))).isoformat(),
+            "range_min": range_min,
+            "range_max": range_min + rng.randint(10, 500),
+            "selected_exercises": rng.sample(
+                self.exercises[goal_type_id],
+                min(3, len(self.exercises[goal_type_id]))),
+            "goal_type_id": goal_type_id,
+        }
+
+    def schedule_payload(self, rng, user):
+        now = datetime.utcnow()
+        payload = {
+            "start_date": (now - timedelta(
+                days=rng.randint(0, 90))).isoformat(),
+            "end_date": (now + timedelta(
+                days=rng.randint(30, 180))).isoformat(),
+            "selected_exercises": [],
+            "note": f"session {rng.randint(1, 1000)}",
+            "crontab_value": rng.choice(CRONTABS),
+        }
+        if user.goal_ids:
+            payload["goal_id"] = rng.choice(user.goal_ids)
+        return payload
+
+    def workout_sets(self, rng, count):
+        exercise_ids = [exercise_id for ids in self.exercises.values()
+                        for exercise_id in ids]
+        now = datetime.utcnow()
+        return [
+            {
+                "exercise_id": rng.choice(exercise_ids),
+                "performed_at": (now - timedelta(
+                    minutes=rng.randint(0, HISTORY_DAYS * 1440))).isoformat(),
+                "value_1": rng.randint(1, 5),
+                "value_2": rng.randint(5, 20),
+                "weight": round(rng.uniform(10, 120), 1),
+            }
+            for _ in range(count)
+        ]
+
+    # Operations, one per endpoint. Each picks its arguments from rng.
+
+    async def login(self, rng, user):
+        await self.request("POST /auth/token", "POST", "/auth/token", data={
+            "username": user.username, "password": PASSWORD})
+
+    async def register(self, rng, user):
+        await self.request(
+            "POST /auth/register", "POST", "/auth/register", json={
+                "username": f"lr{uuid.uuid4().hex[:16]}",
+                "password": PASSWORD,
+                "weight": rng.randint(50, 120),
+                "height": rng.randint(150, 200),
+            })
+
+    async def current_user(self, rng, user):
+        await self.request("GET /user/", "GET", "/user/", user)
+
+    async def change_user_data(self, rng, user):
+        await self.request(
+            "PUT /user/data_change", "PUT", "/user/data_change", user,
+            json={"weight": rng.randint(50, 120),
+                  "height": rng.randint(150, 200)})
+
+    async def exercise_types(self, rng, user):
+        await self.request("GET /exercise/exercise_types/", "GET",
+                           "/exercise/exercise_types/")
+
+    async def exercise_units(self, rng, user):
+        await self.request("GET /exercise/exercise_units/", "GET",
+                           "/exercise/exercise_units/")
+
+    async def exercises_by_type(self, rng, user):
+        await self.request("GET /exercise/sorted/exercise_type", "GET",
+                           "/exercise/sorted/exercise_type")
+
+    async def exercises_by_goal_type(self, rng, user):
+        await self.request("GET /exercise/sorted/exercise_goal_type", "GET",
+                           "/exercise/sorted/exercise_goal_type")
+
+    async def exercise(self, rng, user):
+        exercise_id = rng.choice(rng.choice(list(self.exercises.values())))
+        await self.request("GET /exercise/{exercise_id}", "GET",
+                           f"/exercise/{exercise_id}")
+
+    async def goal_types(self, rng, user):
+        await self.request("GET /goal/all_goal_types/", "GET",
+                           "/goal/all_goal_types/")
+
+    async def create_goal(self, rng, user):
+        await self.request("POST /goal/create_goal/", "POST",
+                           "/goal/create_goal/", user,
+                           json=self.goal_payload(rng))
+
+    # Clients revalidate the lists they have seen, like a browser would
+    async def conditional_get(self, label, url, user):
+        headers = {}
+        if url in user.etags:
+            headers["If-None-Match"] = user.etags[url]
+        response = await self.request(label, "GET", url, user,
+                                      headers=headers)
+        if response is not None and "etag" in response.headers:
+            user.etags[url] = response.headers["etag"]
+
+    async def personal_goals(self, rng, user):
+        await self.conditional_get("GET /goal/personal_goals/",
+                                   "/goal/personal_goals/", user)
+
+    async def edit_goal(self, rng, user):
+        if not user.goal_ids:
+            return
+        range_min = rng.randint(1, 50)
+        await self.request(
+            "PUT /goal/personal_goals/{goal_id}", "PUT",
+            f"/goal/personal_goals/{rng.choice(user.goal_ids)}", user,
+            json={"goal_name": f"goal {rng.randint(1, 10 ** 6)}",
+                  "range_min": range_min,
+                  "range_max": range_min + rng.randint(10, 500)})
+
+    async def delete_goal(self, rng, user):
+        if len(user.goal_ids) < 2:
+            return
+        goal_id = user.goal_ids.pop(rng.randrange(len(user.goal_ids)))
+        await self.request("DELETE /goal/personal_goals/{goal_id}", "DELETE",
+                           f"/goal/personal_goals/{goal_id}", user)
+
+    async def goal_batch(self, rng, user, create=5, update=5):
+        update = rng.sample(user.goal_ids, min(update, len(user.goal_ids)))
+        response = await self.request(
+            "POST /goal/batch", "POST", "/goal/batch", user, json={
+                "create": [self.goal_payload(rng) for _ in range(create)],
+                "update": [dict(self.goal_payload(rng), goal_id=goal_id)
+                           for goal_id in update],
+            })
+        if response is not None and response.status_code == 200:
+            user.goal_ids.extend(result["goal_id"]
+                                 for result in response.json()["create"]
+                                 if result["status"] == 201)
+
+    async def create_schedule(self, rng, user):
+        await self.request("POST /schedule/create_schedule", "POST",
+                           "/schedule/create_schedule", user,
+                           json=self.schedule_payload(rng, user))
+
+    async def user_schedules(self, rng, user):
+        await self.conditional_get("GET /schedule/user_schedules/",
+                                   "/schedule/user_schedules/", user)
+
+    async def edit_schedule(self, rng, user):
+        if not user.schedule_ids:
+            return
+        await self.request(
+            "PUT /schedule/user_schedules/{schedule_id}", "PUT",
+            f"/schedule/user_schedules/{rng.choice(user.schedule_ids)}",
+            user, json={"note": f"session {rng.randint(1, 1000)}",
+                        "crontab_value": rng.choice(CRONTABS)})
+
+    async def delete_schedule(self, rng, user):
+        if len(user.schedule_ids) < 2:
+            return
+        schedule_id = user.schedule_ids.pop(
+            rng.randrange(len(user.schedule_ids)))
+        await self.request(
+            "DELETE /schedule/user_schedules/{schedule_id}", "DELETE",
+            f"/schedule/user_schedules/{schedule_id}", user)
+
+    async def schedule_occurrences(self, rng, user):
+        if not user.schedule_ids:
+            return
+        await self.request(
+            "GET /schedule/user_schedules/{schedule_id}/occurrences", "GET",
+            f"/schedule/user_schedules/{rng.choice(user.schedule_ids)}"
+            "/occurrences", user)
+
+    async def calendar(self, rng, user):
+        await self.request("GET /schedule/calendar", "GET",
+                           "/schedule/calendar", user)
+
+    async def schedule_batch(self, rng, user, create=3, update=3):
+        update = rng.sample(user.schedule_ids,
+                            min(update, len(user.schedule_ids)))
+        response = await self.request(
+            "POST /schedule/batch", "POST", "/schedule/batch", user, json={
+                "create": [self.schedule_payload(rng, user)
+                           for _ in range(create)],
+                "update": [dict(self.schedule_payload(rng, user),
+                                schedule_id=schedule_id)
+                           for schedule_id in update],
+            })
+        if response is not None and response.status_code == 200:
+            user.schedule_ids.extend(result["schedule_id"]
+                                     for result in response.json()["create"]
+                                     if result["status"] == 201)
+
+    async def history(self, rng, user):
+        await self.request("GET /history/", "GET", "/history/", user)
+
+    async def history_ndjson(self, rng, user):
+        await self.request("GET /history/?format=ndjson", "GET", "/history/",
+                           user, params={"format": "ndjson"})
+
+    async def history_analytics(self, rng, user):
+        await self.request(
+            "GET /history/analytics", "GET", "/history/analytics", user,
+            params={"bucket": rng.choice(("day", "week", "month"))})
+
+    async def add_bmi_history(self, rng, user):
+        await self.request(
+            "POST /history/add_bmi_history/{bmi_value}", "POST",
+            f"/history/add_bmi_history/{rng.randint(17, 35)}", user)
+
+    async def delete_history(self, rng, user):
+        if len(user.history_ids) < 2:
+            return
+        history_id = user.history_ids.pop(
+            rng.randrange(len(user.history_ids)))
+        await self.request("DELETE /history/{history_id}", "DELETE",
+                           f"/history/{history_id}", user)
+
+    async def workout_sets_batch(self, rng, user, count=50):
+        await self.request("POST /workout_sets/batch", "POST",
+                           "/workout_sets/batch", user,
+                           json=self.workout_sets(rng, count))
+
+
+# (weight, operation), reads dominate like they do for the mobile clients
+MIX = (
+    (2, LoadTest.login),
+    (1, LoadTest.register),
+    (6, LoadTest.current_user),
+    (2, LoadTest.change_user_data),
+    (2, LoadTest.exercise_types),
+    (2, LoadTest.exercise_units),
+    (2, LoadTest.exercises_by_type),
+    (2, LoadTest.exercises_by_goal_type),
+    (4, LoadTest.exercise),
+    (3, LoadTest.goal_types),
+    (2, LoadTest.create_goal),
+    (10, LoadTest.personal_goals),
+    (2, LoadTest.edit_goal),
+    (1, LoadTest.delete_goal),
+    (1, LoadTest.goal_batch),
+    (2, LoadTest.create_schedule),
+    (8, LoadTest.user_schedules),
+    (2, LoadTest.edit_schedule),
+    (1, LoadTest.delete_schedule),
+    (4, LoadTest.schedule_occurrences),
+    (4, LoadTest.calendar),
+    (1, LoadTest.schedule_batch),
+    (6, LoadTest.history),
+    (1, LoadTest.history_ndjson),
+    (3, LoadTest.history_analytics),
+    (2, LoadTest.add_bmi_history),
+    (1, LoadTest.delete_history),
+    (4, LoadTest.workout_sets_batch),
+)
+
+
+def start_server(port, workers):
+    env = dict(
+        os.environ,
+        # Every client logs in from 127.0.0.1 as a handful of users
+        LOGIN_ATTEMPTS_PER_USERNAME="0",
+        LOGIN_ATTEMPTS_PER_IP="0",
+        METRICS_ENABLED="1",
+        INTERNAL_API_TOKEN=INTERNAL_TOKEN,
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+
+
+async def wait_until_ready(client, server, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            response = await client.get("/goal/all_goal_types/")
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("server did not start in time")
+
+
+async def seed_users(rng, prefix, users, history):
+    hashed_password = auth.bcrypt_context.hash(PASSWORD)
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            insert(User).returning(User.user_id, User.username,
+                                   sort_by_parameter_order=True),
+            [dict(username=f"{prefix}{index:05d}", fullname="Load Test",
+                  hashed_password=hashed_password,
+                  weight=rng.randint(50, 120), height=rng.randint(150, 200),
+                  active=True)
+             for index in range(users)],
+        )).all()
+        bench_users = [BenchUser(user_id, username)
+                       for user_id, username in rows]
+
+        # A weight and height series with a few bmi entries per user
+        history_rows = []
+        for user in bench_users:
+            weight = rng.randint(60, 110)
+            for index in range(history):
+                weight = max(31, min(299, weight + rng.randint(-2, 2)))
+                history_rows.append(dict(
+                    user_id=user.id,
+                    created=now - timedelta(
+                        days=HISTORY_DAYS * (history - index) / history),
+                    weight_change=weight,
+                    height_change=rng.randint(150, 200)
+                    if index % 50 == 0 else None,
+                    bmi_calculation=rng.randint(18, 32)
+                    if index % 10 == 0 else None,
+                ))
+        if history_rows:
+            by_id = {user.id: user for user in bench_users}
+            for user_id, history_id in await db.execute(
+                insert(User_History).returning(
+                    User_History.user_id, User_History.history_id),
+                history_rows,
+            ):
+                by_id[user_id].history_ids.append(history_id)
+        await db.commit()
+    return bench_users
+
+
+async def seed(test, rng, args):
+    started = time.perf_counter()
+    prefix = f"lt{uuid.uuid4().hex[:8]}"
+    users = await seed_users(rng, prefix, args.users, args.history)
+
+    response = await test.client.get("/exercise/sorted/exercise_goal_type")
+    response.raise_for_status()
+    for exercise in response.json()["exercises"]:
+        test.exercises.setdefault(exercise["goal_type_id"], []).append(
+            exercise["exercise_id"])
+
+    # Goals first, schedules point at them and sets count towards them
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def seed_user(user, rng):
+        async with limit:
+            for offset in range(0, args.goals, 100):
+                await test.goal_batch(
+                    rng, user, create=min(100, args.goals - offset),
+                    update=0)
+            for offset in range(0, args.schedules, 100):
+                await test.schedule_batch(
+                    rng, user, create=min(100, args.schedules - offset),
+                    update=0)
+            for offset in range(0, args.sets, 5000):
+                await test.workout_sets_batch(
+                    rng, user, count=min(5000, args.sets - offset))
+
+    await asyncio.gather(*(
+        seed_user(user, random.Random(rng.random())) for user in users))
+    failed = {label: dict(statuses)
+              for label, statuses in test.statuses.items()
+              if set(statuses) - {200, 201}}
+    if failed:
+        raise RuntimeError(f"seeding failed: {failed}")
+    test.latencies.clear()
+    test.statuses.clear()
+
+    return users, {
+        "username_prefix": prefix,
+        "users": len(users),
+        "history_rows": sum(len(user.history_ids) for user in users),
+        "goals": sum(len(user.goal_ids) for user in users),
+        "schedules": sum(len(user.schedule_ids) for user in users),
+        "workout_sets": args.users * args.sets,
+        "seed_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+async def drive(test, users, args):
+    weights = [weight for weight, _ in MIX]
+    operations = [operation for _, operation in MIX]
+    deadline = time.monotonic() + args.duration \
+        if not args.requests else float("inf")
+    remaining = args.requests
+
+    # Every client has its own generator and, when there are enough
+    # users, its own users, so deletes do not race each other
+    async def client(index):
+        nonlocal remaining
+        rng = random.Random(f"{args.seed}-{index}")
+        own = users[index::args.concurrency] or [users[index % len(users)]]
+        while time.monotonic() < deadline:
+            if args.requests:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            operation = rng.choices(operations, weights)[0]
+            await operation(test, rng, rng.choice(own))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index)
+                           for index in range(args.concurrency)))
+    return time.perf_counter() - started
+
+
+def route_report(latencies, statuses, seconds):
+    errors = sum(count for status_code, count in statuses.items()
+                 if status_code == "error" or status_code >= 500)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(status_code): count
+                     for status_code, count in sorted(
+                         statuses.items(), key=lambda item: str(item[0]))},
+        "requests_per_second": round(len(latencies) / seconds, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+def report(test, seconds, before, after):
+    routes = {}
+    for label in sorted(test.latencies):
+        result = route_report(
+            test.latencies[label], test.statuses[label], seconds)
+        if before is not None:
+            # ndjson shares the route, and the numbers, of GET /history/
+            key = label.split("?")[0]
+            count = after[(key, "db_queries_count")] - \
+                before[(key, "db_queries_count")]
+            if count:
+                result["queries_per_request"] = round(
+                    (after[(key, "db_queries_sum")] -
+                     before[(key, "db_queries_sum")]) / count, 2)
+                result["db_ms_per_request"] = round(
+                    (after[(key, "db_seconds_total")] -
+                     before[(key, "db_seconds_total")]) / count * 1000, 2)
+        routes[label] = result
+
+    latencies = [value for values in test.latencies.values()
+                 for value in values]
+    statuses = defaultdict(int)
+    for counts in test.statuses.values():
+        for status_code, count in counts.items():
+            statuses[status_code] += count
+    totals = route_report(latencies, statuses, seconds)
+    totals["seconds"] = round(seconds, 2)
+    return totals, routes
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    server = start_server(args.port, args.workers)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            limits=httpx.Limits(max_connections=args.concurrency),
+            timeout=60,
+        ) as client:
+            await wait_until_ready(client, server)
+            test = LoadTest(client)
+            users, dataset = await seed(test, rng, args)
+
+            before = after = None
+            if args.workers == 1:
+                before = await scrape_queries(client)
+            seconds = await drive(test, users, args)
+            if args.workers == 1:
+                after = await scrape_queries(client)
+    finally:
+        server.terminate()
+        server.wait()
+
+    totals, routes = report(test, seconds, before, after)
+    return {
+        "config": {key: value for key, value in vars(args).items()
+                   if key != "output"},
+        "started": datetime.utcnow().isoformat(timespec="seconds"),
+        "dataset": dataset,
+        "totals": totals,
+        "routes": routes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--history", type=int, default=200,
+                        help="history rows per user")
+    parser.add_argument("--goals", type=int, default=20,
+                        help="goals per user")
+    parser.add_argument("--schedules", type=int, default=10,
+                        help="schedules per user")
+    parser.add_argument("--sets", type=int, default=500,
+                        help="workout sets per user")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--requests", type=int, default=0,
+                        help="stop after this many requests instead")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    result = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(result + "\n")
+    print(result)
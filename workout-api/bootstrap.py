@@ -0,0 +1,59 @@
+import logging
+import time
+
+from sqlalchemy import text
+
+from database import engine, ensure_database
+from schema import upgrade_database
+from seed import populate_database
+
+
+# Arbitrary application wide key for pg_advisory_lock
+BOOTSTRAP_LOCK_KEY = 720351962
+
+# uvicorn configures this logger to print INFO records
+logger = logging.getLogger("uvicorn.error")
+
+
+# Creates the database, runs migrations and seeds reference data.
+# Workers starting together serialize on a Postgres advisory lock, the
+# first one does the work and the rest find nothing left to do.
+# Returns the time spent in each step, in seconds.
+def bootstrap_database():
+    timings = {}
+    started = time.perf_counter()
+
+    ensure_database()
+    timings["ensure_database"] = time.perf_counter() - started
+
+    with engine.connect() as connection:
+        step = time.perf_counter()
+        connection.execute(
+            text("SELECT pg_advisory_lock(:key)"),
+            {"key": BOOTSTRAP_LOCK_KEY},
+        )
+        connection.commit()
+        timings["lock_wait"] = time.perf_counter() - step
+        try:
+            step = time.perf_counter()
+            upgrade_database(connection)
+            connection.commit()
+            timings["migrations"] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            inserted = populate_database(connection)
+            connection.commit()
+            timings["seed"] = time.perf_counter() - step
+            if any(inserted.values()):
+                logger.info(f"Seeded reference data: {inserted}")
+        finally:
+            connection.rollback()
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": BOOTSTRAP_LOCK_KEY},
+            )
+            connection.commit()
+
+    # Routes use the async engine, no need to keep these connections
+    engine.dispose()
+    return timings
@@ -1,3 +1,15 @@
 from .request_models import (GoalRequestModel, ChangeUserDataRequest,
                   ScheduleRequestModel, ChangeUserDataRequest,
-                  CreateUserRequest, Token)
\ No newline at end of file
+                  CreateUserRequest, Token, GoalBatchRequestModel,
+                  ScheduleBatchRequestModel, WorkoutSetRequestModel)
+from .response_models import (MessageResponse, UserCreatedResponse,
+                  UserDataResponse, UserDataChangedResponse,
+                  ExercisesByTypeResponse, ExercisesByGoalTypeResponse,
+                  ExerciseResponse, ExerciseTypesResponse,
+                  ExerciseUnitsResponse, GoalTypesResponse,
+                  GoalCreatedResponse, PersonalGoalsResponse, GoalResponse,
+                  GoalBatchResponse, ScheduleCreatedResponse,
+                  PersonalSchedulesResponse, ScheduleResponse,
+                  ScheduleOccurrencesResponse, CalendarResponse,
+                  ScheduleBatchResponse, HistoryEntryModel,
+                  HistoryAnalyticsResponse, WorkoutSetBatchResponse)
\ No newline at end of file
@@ -2,6 +2,9 @@ from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import datetime
 
+from config import BATCH_MAX_ITEMS
+from services.cron import CronError, parse_cron
+
 
 # Data Validation
 class CreateUserRequest(BaseModel):
@@ -62,6 +65,47 @@ class ScheduleRequestModel(BaseModel):
             raise ValueError("end_date must not be earlier than start_date")
         return v
 
+    @validator("crontab_value")
+    def check_crontab(cls, v):
+        if v:
+            try:
+                parse_cron(v)
+            except CronError as e:
+                raise ValueError(f"Invalid crontab_value: {e}")
+        return v
+
+
+class GoalBatchUpdateModel(GoalRequestModel):
+    goal_id: int = Field(ge=1)
+
+
+class GoalBatchRequestModel(BaseModel):
+    create: List[GoalRequestModel] = Field([], max_length=BATCH_MAX_ITEMS)
+    update: List[GoalBatchUpdateModel] = Field(
+        [], max_length=BATCH_MAX_ITEMS)
+    delete: List[int] = Field([], max_length=BATCH_MAX_ITEMS)
+
+
+class ScheduleBatchUpdateModel(ScheduleRequestModel):
+    schedule_id: int = Field(ge=1)
+
+
+class ScheduleBatchRequestModel(BaseModel):
+    create: List[ScheduleRequestModel] = Field(
+        [], max_length=BATCH_MAX_ITEMS)
+    update: List[ScheduleBatchUpdateModel] = Field(
+        [], max_length=BATCH_MAX_ITEMS)
+    delete: List[int] = Field([], max_length=BATCH_MAX_ITEMS)
+
+
+class WorkoutSetRequestModel(BaseModel):
+    exercise_id: int = Field(ge=1)
+    schedule_id: Optional[int] = Field(None, ge=1)
+    performed_at: Optional[datetime] = None
+    value_1: Optional[float] = Field(None, ge=0)
+    value_2: Optional[float] = Field(None, ge=0)
+    weight: Optional[float] = Field(None, ge=0)
+
 
 class ChangeUserDataRequest(BaseModel):
     fullname: Optional[str] = None
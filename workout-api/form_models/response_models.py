@@ -0,0 +1,258 @@
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+
+
+# Response Schemas, key names (including the aliased ones) are part of the
+# public api and must not change
+
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+# Auth and User
+class UserCreatedResponse(BaseModel):
+    user: str = Field(alias="User")
+
+
+class CurrentUser(BaseModel):
+    username: str
+    id: int
+
+
+class UserDataResponse(BaseModel):
+    user: CurrentUser = Field(alias="User")
+    fullname: Optional[str] = None
+    weight: Optional[int] = None
+    height: Optional[int] = None
+
+
+class UserDataChangedResponse(BaseModel):
+    request_successful: str = Field(alias="Request Successfull")
+
+
+# Exercises, served pre-serialized from the catalog
+class ExerciseResponseModel(BaseModel):
+    exercise_id: int
+    exercise_name: str
+    description: str
+    instructions: Optional[str] = None
+    target_muscles: Optional[str] = None
+    difficulty: Optional[str] = None
+    exercise_type_id: Optional[int] = None
+    unit_type_id: Optional[int] = None
+    goal_type_id: Optional[int] = None
+
+
+class ExerciseByTypeModel(ExerciseResponseModel):
+    exercise_type_name: str
+
+
+class ExercisesByTypeResponse(BaseModel):
+    exercises: List[ExerciseByTypeModel]
+
+
+class ExerciseByGoalTypeModel(BaseModel):
+    goal_target: str
+    exercise_id: int
+    exercise_name: str
+    description: str
+    instructions: Optional[str] = None
+    target_muscles: Optional[str] = None
+    difficulty: Optional[str] = None
+    goal_type_id: int
+
+
+class ExercisesByGoalTypeResponse(BaseModel):
+    exercises: List[ExerciseByGoalTypeModel]
+
+
+class ExerciseResponse(BaseModel):
+    exercises: ExerciseResponseModel
+
+
+class ExerciseTypeModel(BaseModel):
+    exercise_type_id: int
+    exercise_type_name: Optional[str] = None
+
+
+class ExerciseTypesResponse(BaseModel):
+    exercise_types: List[ExerciseTypeModel]
+
+
+class ExerciseUnitModel(BaseModel):
+    unit_id: int
+    unit_1: str
+    unit_2: Optional[str] = None
+
+
+class ExerciseUnitsResponse(BaseModel):
+    exercise_units: List[ExerciseUnitModel]
+
+
+# Goals
+class GoalTypeModel(BaseModel):
+    goal_type_id: int
+    goal_target: Optional[str] = None
+
+
+class GoalTypesResponse(BaseModel):
+    goal_types: List[GoalTypeModel]
+
+
+class GoalCreatedResponse(BaseModel):
+    request_successful: str = Field(alias="Request Succesfull")
+
+
+class SelectedExerciseModel(ExerciseResponseModel):
+    unit_1: Optional[str] = None
+    unit_2: Optional[str] = None
+
+
+class PersonalGoalModel(BaseModel):
+    goal_id: int
+    goal_name: Optional[str] = None
+    user_id: int
+    created_time: Optional[datetime] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    range_min: Optional[int] = None
+    range_max: Optional[int] = None
+    selected_exercises: List[SelectedExerciseModel]
+    completed: Optional[bool] = None
+    goal_type_id: Optional[int] = None
+    goal_target: Optional[str] = None
+    progress_value: Optional[float] = None
+    progress_percent: Optional[float] = None
+    projected_completion: Optional[datetime] = None
+
+
+class PersonalGoalsResponse(BaseModel):
+    user_goals: List[PersonalGoalModel]
+
+
+# Goal row as stored, returned after edits
+class GoalResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    goal_id: int
+    goal_name: Optional[str] = None
+    user_id: int
+    created_time: Optional[datetime] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    range_min: Optional[int] = None
+    range_max: Optional[int] = None
+    selected_exercises: Optional[List[int]] = None
+    completed: Optional[bool] = None
+    goal_type_id: Optional[int] = None
+
+
+# Batch results, fields that do not apply to an item are left out
+class GoalBatchItemResult(BaseModel):
+    index: int
+    status: int
+    goal_id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class GoalBatchResponse(BaseModel):
+    create: List[GoalBatchItemResult]
+    update: List[GoalBatchItemResult]
+    delete: List[GoalBatchItemResult]
+
+
+# Schedules
+class ScheduleCreatedResponse(BaseModel):
+    request_successful: str = Field(alias="Request Succesful")
+
+
+class ScheduleResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    schedule_id: int
+    user_id: int
+    goal_id: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    selected_exercises: Optional[List[int]] = None
+    note: Optional[str] = None
+    extended_note: Optional[str] = None
+    crontab_value: Optional[str] = None
+
+
+class PersonalSchedulesResponse(BaseModel):
+    schedules: List[ScheduleResponse]
+
+
+class ScheduleOccurrencesResponse(BaseModel):
+    schedule_id: int
+    crontab_value: str
+    window_start: datetime = Field(alias="from")
+    window_end: datetime = Field(alias="to")
+    occurrences: List[datetime]
+    next_from: Optional[datetime] = None
+
+
+class CalendarEventModel(BaseModel):
+    at: datetime
+    schedule_id: int
+    goal_id: Optional[int] = None
+    note: Optional[str] = None
+
+
+class CalendarResponse(BaseModel):
+    window_start: datetime = Field(alias="from")
+    window_end: datetime = Field(alias="to")
+    events: List[CalendarEventModel]
+    next_cursor: Optional[str] = None
+
+
+class ScheduleBatchItemResult(BaseModel):
+    index: int
+    status: int
+    schedule_id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class ScheduleBatchResponse(BaseModel):
+    create: List[ScheduleBatchItemResult]
+    update: List[ScheduleBatchItemResult]
+    delete: List[ScheduleBatchItemResult]
+
+
+# History, values that were not changed are left out of each entry
+class HistoryEntryModel(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    history_id: int
+    created: datetime
+    fullname_change: Optional[str] = None
+    weight_change: Optional[int] = None
+    height_change: Optional[int] = None
+    bmi_calculation: Optional[int] = None
+
+
+class HistorySeriesModel(BaseModel):
+    avg: List[Optional[float]]
+    min: List[Optional[int]]
+    max: List[Optional[int]]
+    count: List[int]
+    change: List[Optional[float]]
+    moving_average: List[Optional[float]]
+    slope_per_day: Optional[float] = None
+
+
+class HistoryAnalyticsResponse(BaseModel):
+    bucket: str
+    window_start: datetime = Field(alias="from")
+    window_end: datetime = Field(alias="to")
+    window: int
+    buckets: List[datetime]
+    series: Dict[str, HistorySeriesModel]
+
+
+# Workout sets
+class WorkoutSetBatchResponse(BaseModel):
+    inserted: int
@@ -1,14 +1,75 @@
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from database import engine, Base
-from seed import populate_database
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+
+from bootstrap import bootstrap_database, logger
+from config import (
+    GZIP_MINIMUM_SIZE, METRICS_ENABLED, PROFILING_ENABLED,
+    PROFILE_SAMPLE_RATE, PROFILE_DIR,
+)
+from database import async_engine
+from services import (
+    reload_catalog, response_cache, instrument_engine, MetricsMiddleware,
+    ProfilingMiddleware, capture_statements,
+)
 
 from routes import (
     auth, exercise_routes, goal_routes,
-    history_routes, schedule_routes, user_routes
+    history_routes, schedule_routes, user_routes, internal_routes,
+    workout_set_routes, metrics_routes,
 )
 
 
-app = FastAPI()
+# Importing this module does no IO, database bootstrap and the reference
+# catalog load run once per worker when the app starts
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Sync engine work, kept off the event loop
+    timings = await run_in_threadpool(bootstrap_database)
+
+    # Reference data is loaded once per process and served from memory
+    step = time.perf_counter()
+    await reload_catalog()
+    timings["catalog"] = time.perf_counter() - step
+    timings["total"] = time.perf_counter() - started
+
+    app.state.startup_timings = {
+        name: round(seconds, 4) for name, seconds in timings.items()
+    }
+    logger.info(f"Startup finished in {timings['total']:.3f}s: "
+                f"{app.state.startup_timings}")
+
+    if history_routes.history_writer is not None:
+        history_routes.history_writer.start()
+
+    yield
+
+    if history_routes.history_writer is not None:
+        await history_routes.history_writer.close()
+    await response_cache.close()
+    await auth.login_throttle.close()
+    auth.password_hasher.shutdown()
+    await async_engine.dispose()
+
+
+# Responses are validated by their response models and rendered with orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# Negotiated with Accept-Encoding, small bodies are sent as they are
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+if PROFILING_ENABLED:
+    # Nothing is added to the request path unless enabled
+    app.add_middleware(ProfilingMiddleware, directory=PROFILE_DIR,
+                       sample_rate=PROFILE_SAMPLE_RATE)
+    capture_statements(async_engine.sync_engine)
+if METRICS_ENABLED:
+    # Outermost, the latency includes compression
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(async_engine.sync_engine)
 
 # Adding Auth Router
 app.include_router(auth.auth)
@@ -17,9 +78,7 @@ app.include_router(exercise_routes.exercise)
 app.include_router(goal_routes.goal)
 app.include_router(schedule_routes.schedule)
 app.include_router(history_routes.hist)
-
-
-Base.metadata.create_all(bind=engine)
-
-
-populate_database()
+app.include_router(workout_set_routes.workout_set)
+app.include_router(internal_routes.internal)
+if METRICS_ENABLED:
+    app.include_router(metrics_routes.metrics)
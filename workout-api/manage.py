@@ -0,0 +1,81 @@
+# Management commands, run from the workout-api directory:
+#   python manage.py migrate   upgrade the schema to the latest revision
+#   python manage.py bootstrap create, migrate and seed the database
+#   python manage.py explain   check the per-user queries use index scans
+#   python manage.py rebuild-progress  recompute every goal progress row
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+
+def migrate(args):
+    from database import ensure_database
+    from schema import upgrade_database
+    ensure_database()
+    upgrade_database()
+    return 0
+
+
+def bootstrap(args):
+    from bootstrap import bootstrap_database
+    timings = bootstrap_database()
+    print(json.dumps(
+        {name: round(seconds, 4) for name, seconds in timings.items()},
+        indent=2,
+    ))
+    return 0
+
+
+def explain(args):
+    from schema import explain_hot_paths
+    results = explain_hot_paths()
+    print(json.dumps(results, indent=2))
+    return 0 if all(r["uses_index"] for r in results.values()) else 1
+
+
+def rebuild_progress(args):
+    from sqlalchemy import select
+    from database import AsyncSessionLocal, async_engine
+    from models import Goal
+    from services import rebuild_goal_progress, bump_collection_versions, GOALS
+
+    async def rebuild():
+        try:
+            async with AsyncSessionLocal() as db:
+                goals = await rebuild_goal_progress(db)
+                # Goal lists held by clients may have changed
+                await bump_collection_versions(
+                    db,
+                    select(Goal.user_id).distinct()
+                    .where(Goal.user_id.is_not(None)),
+                    GOALS,
+                )
+                await db.commit()
+                return goals
+        finally:
+            await async_engine.dispose()
+
+    print(json.dumps({"goals": asyncio.run(rebuild())}))
+    return 0
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "bootstrap": bootstrap,
+    "explain": explain,
+    "rebuild-progress": rebuild_progress,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="manage.py")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""initial schema
+
+Same tables the app used to create with Base.metadata.create_all,
+databases created that way are stamped at this revision.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 20:20:39.160518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exercise_types",
+        sa.Column("exercise_type_id", sa.Integer(), nullable=False),
+        sa.Column("exercise_type_name", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("exercise_type_id"),
+        sa.UniqueConstraint("exercise_type_name"),
+    )
+    op.create_index(
+        op.f("ix_exercise_types_exercise_type_id"),
+        "exercise_types", ["exercise_type_id"], unique=False,
+    )
+    op.create_table(
+        "exercise_units",
+        sa.Column("unit_id", sa.Integer(), nullable=False),
+        sa.Column("unit_1", sa.String(), nullable=False),
+        sa.Column("unit_2", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("unit_id"),
+        sa.UniqueConstraint("unit_1"),
+    )
+    op.create_index(
+        op.f("ix_exercise_units_unit_id"),
+        "exercise_units", ["unit_id"], unique=False,
+    )
+    op.create_table(
+        "goal_types",
+        sa.Column("goal_type_id", sa.Integer(), nullable=False),
+        sa.Column("goal_target", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("goal_type_id"),
+        sa.UniqueConstraint("goal_target"),
+    )
+    op.create_index(
+        op.f("ix_goal_types_goal_type_id"),
+        "goal_types", ["goal_type_id"], unique=False,
+    )
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("fullname", sa.String(), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("weight", sa.Integer(), nullable=True),
+        sa.Column("height", sa.Integer(), nullable=True),
+        sa.Column("active", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("user_id"),
+        sa.UniqueConstraint("username"),
+    )
+    op.create_index(
+        op.f("ix_users_user_id"), "users", ["user_id"], unique=False,
+    )
+    op.create_table(
+        "exercises",
+        sa.Column("exercise_id", sa.Integer(), nullable=False),
+        sa.Column("exercise_name", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("instructions", sa.String(), nullable=True),
+        sa.Column("target_muscles", sa.String(), nullable=True),
+        sa.Column("difficulty", sa.String(), nullable=True),
+        sa.Column("exercise_type_id", sa.Integer(), nullable=True),
+        sa.Column("unit_type_id", sa.Integer(), nullable=True),
+        sa.Column("goal_type_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["exercise_type_id"], ["exercise_types.exercise_type_id"]),
+        sa.ForeignKeyConstraint(
+            ["goal_type_id"], ["goal_types.goal_type_id"]),
+        sa.ForeignKeyConstraint(
+            ["unit_type_id"], ["exercise_units.unit_id"]),
+        sa.PrimaryKeyConstraint("exercise_id"),
+    )
+    op.create_index(
+        op.f("ix_exercises_exercise_id"),
+        "exercises", ["exercise_id"], unique=False,
+    )
+    op.create_table(
+        "goals",
+        sa.Column("goal_id", sa.Integer(), nullable=False),
+        sa.Column("goal_name", sa.String(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("created_time", sa.DateTime(), nullable=True),
+        sa.Column("start_date", sa.DateTime(), nullable=True),
+        sa.Column("end_date", sa.DateTime(), nullable=True),
+        sa.Column("range_min", sa.Integer(), nullable=True),
+        sa.Column("range_max", sa.Integer(), nullable=True),
+        sa.Column("selected_exercises", sa.ARRAY(sa.Integer()),
+                  nullable=True),
+        sa.Column("completed", sa.Boolean(), nullable=True),
+        sa.Column("goal_type_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["goal_type_id"], ["goal_types.goal_type_id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"]),
+        sa.PrimaryKeyConstraint("goal_id"),
+    )
+    op.create_index(
+        op.f("ix_goals_goal_id"), "goals", ["goal_id"], unique=False,
+    )
+    op.create_table(
+        "user_history",
+        sa.Column("history_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("created", sa.DateTime(), nullable=True),
+        sa.Column("fullname_change", sa.String(), nullable=True),
+        sa.Column("weight_change", sa.Integer(), nullable=True),
+        sa.Column("height_change", sa.Integer(), nullable=True),
+        sa.Column("bmi_calculation", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"]),
+        sa.PrimaryKeyConstraint("history_id"),
+    )
+    op.create_index(
+        op.f("ix_user_history_history_id"),
+        "user_history", ["history_id"], unique=False,
+    )
+    op.create_table(
+        "schedules",
+        sa.Column("schedule_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("goal_id", sa.Integer(), nullable=True),
+        sa.Column("start_date", sa.DateTime(), nullable=True),
+        sa.Column("end_date", sa.DateTime(), nullable=True),
+        sa.Column("selected_exercises", sa.ARRAY(sa.Integer()),
+                  nullable=True),
+        sa.Column("note", sa.String(), nullable=True),
+        sa.Column("extended_note", sa.String(), nullable=True),
+        sa.Column("crontab_value", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["goal_id"], ["goals.goal_id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"]),
+        sa.PrimaryKeyConstraint("schedule_id"),
+    )
+    op.create_index(
+        op.f("ix_schedules_schedule_id"),
+        "schedules", ["schedule_id"], unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_schedules_schedule_id"), table_name="schedules")
+    op.drop_table("schedules")
+    op.drop_index(
+        op.f("ix_user_history_history_id"), table_name="user_history")
+    op.drop_table("user_history")
+    op.drop_index(op.f("ix_goals_goal_id"), table_name="goals")
+    op.drop_table("goals")
+    op.drop_index(op.f("ix_exercises_exercise_id"), table_name="exercises")
+    op.drop_table("exercises")
+    op.drop_index(op.f("ix_users_user_id"), table_name="users")
+    op.drop_table("users")
+    op.drop_index(
+        op.f("ix_goal_types_goal_type_id"), table_name="goal_types")
+    op.drop_table("goal_types")
+    op.drop_index(
+        op.f("ix_exercise_units_unit_id"), table_name="exercise_units")
+    op.drop_table("exercise_units")
+    op.drop_index(
+        op.f("ix_exercise_types_exercise_type_id"),
+        table_name="exercise_types")
+    op.drop_table("exercise_types")
@@ -0,0 +1,60 @@
+"""hot path indexes
+
+Composite indexes matching the per-user route queries and GIN indexes
+for selected_exercises array lookups.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 20:40:12.502113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /goal/personal_goals/ filters by user and sorts by these columns
+    op.create_index(
+        "ix_goals_user_id_start_date_created_time",
+        "goals", ["user_id", "start_date", "created_time"],
+    )
+    op.create_index(
+        "ix_goals_selected_exercises",
+        "goals", ["selected_exercises"], postgresql_using="gin",
+    )
+    # /schedule/user_schedules/ and per schedule lookups by owner
+    op.create_index(
+        "ix_schedules_user_id_schedule_id",
+        "schedules", ["user_id", "schedule_id"],
+    )
+    op.create_index("ix_schedules_goal_id", "schedules", ["goal_id"])
+    op.create_index(
+        "ix_schedules_selected_exercises",
+        "schedules", ["selected_exercises"], postgresql_using="gin",
+    )
+    # /history/ keyset pagination on (created, history_id) per user
+    op.create_index(
+        "ix_user_history_user_id_created_history_id",
+        "user_history", ["user_id", "created", "history_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_user_history_user_id_created_history_id",
+        table_name="user_history")
+    op.drop_index("ix_schedules_selected_exercises", table_name="schedules")
+    op.drop_index("ix_schedules_goal_id", table_name="schedules")
+    op.drop_index(
+        "ix_schedules_user_id_schedule_id", table_name="schedules")
+    op.drop_index("ix_goals_selected_exercises", table_name="goals")
+    op.drop_index(
+        "ix_goals_user_id_start_date_created_time", table_name="goals")
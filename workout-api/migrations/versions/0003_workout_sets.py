@@ -0,0 +1,52 @@
+"""workout sets
+
+Performed sets pushed by clients in bulk, linked to the user, the
+exercise and optionally the schedule they were done for.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 21:05:47.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "workout_sets",
+        sa.Column("set_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("exercise_id", sa.Integer(), nullable=False),
+        sa.Column("schedule_id", sa.Integer(), nullable=True),
+        sa.Column("performed_at", sa.DateTime(), nullable=False),
+        sa.Column("value_1", sa.Float(), nullable=True),
+        sa.Column("value_2", sa.Float(), nullable=True),
+        sa.Column("weight", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["exercise_id"], ["exercises.exercise_id"]),
+        sa.ForeignKeyConstraint(
+            ["schedule_id"], ["schedules.schedule_id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.user_id"]),
+        sa.PrimaryKeyConstraint("set_id"),
+    )
+    # Per user reads by time
+    op.create_index(
+        "ix_workout_sets_user_id_performed_at",
+        "workout_sets", ["user_id", "performed_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_workout_sets_user_id_performed_at", table_name="workout_sets")
+    op.drop_table("workout_sets")
@@ -0,0 +1,44 @@
+"""goal progress
+
+Per goal running aggregates of workout sets and weight history, removed
+with their goal.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 21:32:08.914266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "goal_progress",
+        sa.Column("goal_id", sa.Integer(), nullable=False),
+        sa.Column("set_count", sa.Integer(), nullable=False),
+        sa.Column("total_value", sa.Float(), nullable=False),
+        sa.Column("first_activity", sa.DateTime(), nullable=True),
+        sa.Column("last_activity", sa.DateTime(), nullable=True),
+        sa.Column("start_weight", sa.Integer(), nullable=True),
+        sa.Column("current_weight", sa.Integer(), nullable=True),
+        sa.Column("weight_updated", sa.DateTime(), nullable=True),
+        sa.Column("updated", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["goal_id"], ["goals.goal_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("goal_id"),
+    )
+    # Filled for existing goals by: python manage.py rebuild-progress
+
+
+def downgrade() -> None:
+    op.drop_table("goal_progress")
@@ -0,0 +1,38 @@
+"""collection versions
+
+Per user versions of the goals and schedules collections, backing the
+ETag of /goal/personal_goals/ and /schedule/user_schedules/. Users
+without a row are at version 0.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 22:14:36.502917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "collection_versions",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("collection", sa.String(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["users.user_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "collection"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("collection_versions")
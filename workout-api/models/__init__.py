@@ -1,4 +1,5 @@
-from .user import User, User_History
-from .goal import Goal, Goal_Type
+from .user import User, User_History, Collection_Version
+from .goal import Goal, Goal_Type, Goal_Progress
 from .schedule import Schedule
-from .exercises import Exercise, Exercise_Type, Exercise_Unit
\ No newline at end of file
+from .exercises import Exercise, Exercise_Type, Exercise_Unit
+from .workout_set import Workout_Set
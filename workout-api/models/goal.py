@@ -2,13 +2,20 @@ from database import Base
 from sqlalchemy.orm import relationship
 from sqlalchemy import (
     Column, Integer, String,
-    Boolean, ForeignKey, DateTime, ARRAY)
+    Boolean, ForeignKey, DateTime, ARRAY, Index, Float)
 
 from datetime import datetime
 
 
 class Goal(Base):
     __tablename__ = "goals"
+    # Indexes are created by migrations, listed here to keep them in sync
+    __table_args__ = (
+        Index("ix_goals_user_id_start_date_created_time",
+              "user_id", "start_date", "created_time"),
+        Index("ix_goals_selected_exercises", "selected_exercises",
+              postgresql_using="gin"),
+    )
 
     goal_id = Column(Integer, primary_key=True, index=True)
     goal_name = Column(String)
@@ -23,6 +30,30 @@ class Goal(Base):
     goal_type_id = Column(Integer, ForeignKey("goal_types.goal_type_id"))
     goal_type = relationship("Goal_Type", back_populates="goal")
     schedule = relationship("Schedule", back_populates="goal")
+    # Removed by the database together with the goal
+    progress = relationship("Goal_Progress", back_populates="goal",
+                            uselist=False, cascade="all, delete-orphan",
+                            passive_deletes=True)
+
+
+# Running aggregates behind the goal progress, kept up to date as workout
+# sets and weight history arrive (services/goal_progress.py)
+class Goal_Progress(Base):
+    __tablename__ = "goal_progress"
+
+    goal_id = Column(Integer, ForeignKey("goals.goal_id", ondelete="CASCADE"),
+                     primary_key=True)
+    # Sets of the selected exercises inside the goal dates
+    set_count = Column(Integer, nullable=False, default=0)
+    total_value = Column(Float, nullable=False, default=0)
+    first_activity = Column(DateTime, nullable=True)
+    last_activity = Column(DateTime, nullable=True)
+    # Weight goals, from weight_change history rows
+    start_weight = Column(Integer, nullable=True)
+    current_weight = Column(Integer, nullable=True)
+    weight_updated = Column(DateTime, nullable=True)
+    updated = Column(DateTime, default=datetime.utcnow)
+    goal = relationship("Goal", back_populates="progress")
 
 
 # PBeing Populated From Seed
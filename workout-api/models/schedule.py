@@ -7,11 +7,19 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
     ARRAY,
+    Index,
 )
 
 
 class Schedule(Base):
     __tablename__ = "schedules"
+    # Indexes are created by migrations, listed here to keep them in sync
+    __table_args__ = (
+        Index("ix_schedules_user_id_schedule_id", "user_id", "schedule_id"),
+        Index("ix_schedules_goal_id", "goal_id"),
+        Index("ix_schedules_selected_exercises", "selected_exercises",
+              postgresql_using="gin"),
+    )
 
     schedule_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
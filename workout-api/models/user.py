@@ -1,11 +1,13 @@
 from database import Base
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
     ForeignKey,
     DateTime,
-    Boolean
+    Boolean,
+    Index,
 )
 
 from datetime import datetime
@@ -25,6 +27,11 @@ class User(Base):
 
 class User_History(Base):
     __tablename__ = "user_history"
+    # Indexes are created by migrations, listed here to keep them in sync
+    __table_args__ = (
+        Index("ix_user_history_user_id_created_history_id",
+              "user_id", "created", "history_id"),
+    )
 
     history_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
@@ -33,3 +40,15 @@ class User_History(Base):
     weight_change = Column(Integer, nullable=True)
     height_change = Column(Integer, nullable=True)
     bmi_calculation = Column(Integer, nullable=True)
+
+
+# Version of each per-user collection ("goals", "schedules"), bumped in
+# the transactions that change what the collection endpoint returns and
+# used as its ETag (services/collection_versions.py)
+class Collection_Version(Base):
+    __tablename__ = "collection_versions"
+
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"),
+                     primary_key=True)
+    collection = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,40 @@
+from database import Base
+from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+)
+
+from datetime import datetime
+
+
+# Performed work, values are in the units of the exercise
+# (unit_1/unit_2 of its Exercise_Unit, e.g. Sets/Reps or Km/M)
+class Workout_Set(Base):
+    __tablename__ = "workout_sets"
+    # Indexes are created by migrations, listed here to keep them in sync.
+    # Kept to one secondary index, this table takes bulk writes.
+    __table_args__ = (
+        Index("ix_workout_sets_user_id_performed_at",
+              "user_id", "performed_at"),
+    )
+
+    set_id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
+    exercise_id = Column(Integer, ForeignKey("exercises.exercise_id"),
+                         nullable=False)
+    schedule_id = Column(
+        Integer,
+        ForeignKey("schedules.schedule_id", ondelete="SET NULL"),
+        nullable=True,
+    )
+    performed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    value_1 = Column(Float, nullable=True)
+    value_2 = Column(Float, nullable=True)
+    weight = Column(Float, nullable=True)
+    exercise = relationship("Exercise")
@@ -1,9 +1,11 @@
 # Datetime is for Expiration of JWT
 from datetime import timedelta, datetime
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from starlette import status
 from passlib.context import CryptContext
 
@@ -13,20 +15,22 @@ from jose import jwt, JWTError
 
 import logging
 
-from database import SessionLocal
+from config import (
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, TOKEN_CACHE_SIZE,
+    USER_CACHE_TTL, USER_CACHE_SIZE, LOGIN_THROTTLE_WINDOW,
+    LOGIN_ATTEMPTS_PER_USERNAME, LOGIN_ATTEMPTS_PER_IP,
+    LOGIN_THROTTLE_MAX_KEYS, LOGIN_THROTTLE_URL,
+)
+from database import get_db
 from models import User
-from form_models import CreateUserRequest, Token
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from form_models import CreateUserRequest, Token, UserCreatedResponse
+from services import (
+    PasswordHasher, VerifiedTokenCache, IdentityCache,
+    LoginThrottle, MemoryCounters, RedisCounters,
+)
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 # For User Authentification
 
@@ -41,7 +45,23 @@ ALGORITHM = "HS256"
 
 # Password Hashing and Unhashing
 bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashing runs on its own executor, never on the event loop
+password_hasher = PasswordHasher(
+    bcrypt_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+)
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
+# Login attempts per username and client IP, checked before any hashing
+login_throttle = LoginThrottle(
+    RedisCounters(LOGIN_THROTTLE_URL) if LOGIN_THROTTLE_URL
+    else MemoryCounters(LOGIN_THROTTLE_MAX_KEYS),
+    LOGIN_THROTTLE_WINDOW,
+    {"username": LOGIN_ATTEMPTS_PER_USERNAME, "ip": LOGIN_ATTEMPTS_PER_IP},
+)
+
+# Claims of tokens that already passed verification, valid until exp
+token_cache = VerifiedTokenCache(TOKEN_CACHE_SIZE)
+# Column values of recently authenticated users, keyed by user_id
+user_cache = IdentityCache(USER_CACHE_TTL, USER_CACHE_SIZE)
 
 
 # Dependency For Database
@@ -50,6 +70,7 @@ oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 # Creating User Model
 @auth.post(
     "/register",
+    response_model=UserCreatedResponse,
     status_code=status.HTTP_201_CREATED,
     description="Endpoint for user creation/registration",
 )
@@ -60,7 +81,8 @@ async def create_user(
     create_user_model = User(
         username=create_user_request.username,
         fullname=create_user_request.fullname,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=await password_hasher.hash(
+            create_user_request.password),
         weight=create_user_request.weight,
         height=create_user_request.height,
         active=create_user_request.active,
@@ -69,9 +91,10 @@ async def create_user(
     # Commiting Db Additions
     try:
         db.add(create_user_model)
-        db.commit()
+        await db.commit()
         return {"User": "Created Succesfully"}
     except Exception as e:
+        await db.rollback()
         logging.error(f"in auth.create_user, exception: {e}")
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -86,11 +109,17 @@ async def create_user(
 )
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: db_dependency
+    db: db_dependency, request: Request
 ):
+    # Rejected attempts never reach the database or bcrypt
+    await login_throttle.check(
+        username=form_data.username,
+        ip=request.client.host if request.client else None,
+    )
     # authenticate_user is a function that verifies the user's data
     # it also decrypts bcrypted/hashed password
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(
+        form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -102,20 +131,16 @@ async def login_for_access_token(
     return {"access_token": token, "token_type": "bearer"}
 
 
-def authenticate_user(username: str, password: str, db):
+async def authenticate_user(username: str, password: str, db):
     # Quering User By Unique Username
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if not user:
-        return HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Could not find specified username.",
-        )
+        # Unknown usernames take as long as a wrong password
+        await password_hasher.dummy_verify()
+        return False
     # Checking Decrypted password with .verify
-    if not bcrypt_context.verify(password, user.hashed_password):
-        return HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Password is not Bcrypted.",
-        )
+    if not await password_hasher.verify(password, user.hashed_password):
+        return False
     return user
 
 
@@ -136,6 +161,10 @@ def create_access_token(username: str, user_id: int, expires_delta: timedelta):
 
 # JWT Decoding
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
+    # Tokens seen before skip signature verification until they expire
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         # If Decode Fails, We raise an exception
         decode = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -147,10 +176,59 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate user.",
             )
-        return {"username": username, "id": user_id}
+        claims = {"username": username, "id": user_id}
+        # Tokens without exp are never cached
+        if decode.get("exp") is not None:
+            token_cache.put(token, claims, decode["exp"])
+        return claims
     except JWTError:
         logging.error(f"in auth.create_access_token exception: {JWTError}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate user."
         )
+
+
+# Authenticated User row, resolved once per request.
+# FastAPI caches dependency results per request, so every handler and
+# sub-dependency asking for it shares the same instance and query.
+async def get_current_db_user(
+    user: Annotated[dict, Depends(get_current_user)], db: db_dependency
+):
+    values = user_cache.get(user["id"])
+    if values is not None:
+        # Attaching a rebuilt instance as if it was loaded, no SELECT
+        db_user = User(**values)
+        make_transient_to_detached(db_user)
+        db.add(db_user)
+        return db_user
+
+    db_user = await db.scalar(select(User).where(User.user_id == user["id"]))
+    if db_user is None:
+        raise HTTPException(
+            status.HTTP_401_UNAUTHORIZED, detail="Authentification Failed"
+        )
+    user_cache.put(user["id"], {
+        column.key: getattr(db_user, column.key)
+        for column in User.__mapper__.column_attrs
+    })
+    return db_user
+
+
+# Authenticated User row for handlers that change it. Always read from the
+# database and locked until commit, the cached copy may be stale and
+# comparing against it would drop concurrent updates.
+async def get_current_db_user_for_update(
+    user: Annotated[dict, Depends(get_current_user)], db: db_dependency
+):
+    db_user = await db.scalar(
+        select(User)
+        .where(User.user_id == user["id"])
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    if db_user is None:
+        raise HTTPException(
+            status.HTTP_401_UNAUTHORIZED, detail="Authentification Failed"
+        )
+    return db_user
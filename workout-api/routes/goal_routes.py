@@ -1,33 +1,38 @@
+from datetime import datetime
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 from starlette import status
-from database import SessionLocal
+from database import get_db
 import logging
 
-from .auth import get_current_user
-from form_models import GoalRequestModel
+from .auth import get_current_user, get_current_db_user
+from form_models import (
+    GoalRequestModel, GoalBatchRequestModel, GoalTypesResponse,
+    GoalCreatedResponse, PersonalGoalsResponse, GoalResponse,
+    GoalBatchResponse, MessageResponse,
+)
 from models import (
     User,
     Goal,
     Goal_Type,
-    Exercise,
-    Exercise_Unit,
+    Schedule,
+)
+from services import (
+    build_goal_payloads, catalog, catalog_response, rebuild_goal_progress,
+    bump_collection_versions, GOALS, SCHEDULES,
+    response_cache, collection_response, render_json,
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 # user_dependency will act as login_required
 user_dependency = Annotated[dict, Depends(get_current_user)]
+# User row of the caller, loaded once per request
+db_user_dependency = Annotated[User, Depends(get_current_db_user)]
 
 
 # Section For Goals Routes, For Getting, Posting, Editing and Deleting
@@ -35,30 +40,25 @@ goal = APIRouter(prefix="/goal", tags=["goals"])
 
 
 # Querries all Goal types
-@goal.get("/all_goal_types/",
+@goal.get("/all_goal_types/", response_model=GoalTypesResponse,
           description="This endpoint returns all available goal_types.")
-def all_goal_types(db: db_dependency):
-    goal_types = db.query(Goal_Type).all()
-    if not goal_types:
+async def all_goal_types(request: Request):
+    # Served from the in-memory reference catalog
+    entry = await catalog.entry("goal_types")
+    if entry is None:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND, detail="Goal Types are not populated."
         )
-    return {"goal_types": goal_types}
+    return catalog_response(request, entry)
 
 
-@goal.post("/create_goal/", description="This endpoint is for goal creation")
-def create_goal(user: user_dependency, db: db_dependency,
-                goal: GoalRequestModel):
-    # Getting current user
-    user = db.query(User).filter(User.user_id == user["id"]).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
+@goal.post("/create_goal/", response_model=GoalCreatedResponse,
+           description="This endpoint is for goal creation")
+async def create_goal(user: db_user_dependency, db: db_dependency,
+                      goal: GoalRequestModel):
     # Checking for goaltypes existance
-    goal_type = (
-        db.query(Goal_Type).filter(
-            Goal_Type.goal_type_id == goal.goal_type_id).first()
+    goal_type = await db.scalar(
+        select(Goal_Type).where(Goal_Type.goal_type_id == goal.goal_type_id)
     )
     if not goal_type:
         raise HTTPException(
@@ -79,111 +79,75 @@ def create_goal(user: user_dependency, db: db_dependency,
     )
     try:
         db.add(new_goal)
-        db.commit()
-        db.refresh(new_goal)
+        await db.flush()
+        # Sets already logged inside the goal dates count from the start
+        await rebuild_goal_progress(db, Goal.goal_id == new_goal.goal_id)
+        await bump_collection_versions(db, user.user_id, GOALS)
+        await db.commit()
+        await response_cache.invalidate(user.user_id, GOALS)
+        await db.refresh(new_goal)
         return {"Request Succesfull": "Goal entry added"}
     except Exception as e:
         logging.error(f"Exception Raised at create_goal(post) function: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# get user goals
-@goal.get("/personal_goals/",
-          description="This endpoint returns user related goals.")
-def get_personal_goals(user: user_dependency, db: db_dependency):
-    user_goals = (
-        db.query(Goal)
+async def personal_goals_body(db, user_id):
+    user_goals = (await db.scalars(
+        select(Goal)
         .join(Goal_Type)
-        .filter(Goal.user_id == user["id"])
+        .outerjoin(Goal.progress)
+        .options(contains_eager(Goal.goal_type),
+                 contains_eager(Goal.progress))
+        .where(Goal.user_id == user_id)
         .order_by(Goal.start_date.asc(), Goal.created_time.asc())
-        .all()
-    )
+    )).all()
     if not user_goals:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND,
             detail="Goals not found on this specific user"
         )
 
-    user_goals_dict = []
-    for goal in user_goals:
-        # Query of the exercises "related" to the goal using in_ operator
-        selected_exercises = (
-            db.query(Exercise)
-            .filter(Exercise.exercise_id.in_(goal.selected_exercises))
-            .all()
-        )
-
-        # Goal type target relationship to get a goal type name
-        goal_type_target = goal.goal_type.goal_target
-
-        # Converting the exercises to a list of dictionaries
-        selected_exercises_dict = []
-        for exercise in selected_exercises:
-            # Query the exercise unit related to the exercise
-            exercise_unit = (
-                db.query(Exercise_Unit)
-                .filter(Exercise_Unit.unit_id == exercise.unit_type_id)
-                .first()
-            )
+    # Exercises and units for every goal are loaded in bulk, progress
+    # comes from the aggregates loaded above
+    user_goals_dict = await build_goal_payloads(db, user_goals)
 
-            selected_exercises_dict.append(
-                dict(
-                    exercise_id=exercise.exercise_id,
-                    exercise_name=exercise.exercise_name,
-                    description=exercise.description,
-                    instructions=exercise.instructions,
-                    target_muscles=exercise.target_muscles,
-                    difficulty=exercise.difficulty,
-                    exercise_type_id=exercise.exercise_type_id,
-                    unit_type_id=exercise.unit_type_id,
-                    unit_1=exercise_unit.unit_1,
-                    unit_2=exercise_unit.unit_2,
-                    goal_type_id=exercise.goal_type_id,
-                )
-            )
+    return render_json(PersonalGoalsResponse, {"user_goals": user_goals_dict})
 
-        user_goals_dict.append(
-            dict(
-                goal_id=goal.goal_id,
-                goal_name=goal.goal_name,
-                user_id=goal.user_id,
-                created_time=goal.created_time,
-                start_date=goal.start_date,
-                end_date=goal.end_date,
-                range_min=goal.range_min,
-                range_max=goal.range_max,
-                selected_exercises=selected_exercises_dict,
-                completed=goal.completed,
-                goal_type_id=goal.goal_type_id,
-                goal_target=goal_type_target,
-            )
-        )
 
-    return {"user_goals": user_goals_dict}
+# get user goals
+@goal.get("/personal_goals/", response_model=PersonalGoalsResponse,
+          description="This endpoint returns user related goals. "
+          "Supports If-None-Match.")
+async def get_personal_goals(user: user_dependency, db: db_dependency,
+                             request: Request):
+    # Unchanged goals are answered from the collection version alone,
+    # otherwise from the response cache while it holds this version
+    return await collection_response(
+        request, db, user["id"], GOALS,
+        lambda: personal_goals_body(db, user["id"]))
 
 
 # Editability forr personal goals
-@goal.put("/personal_goals/{goal_id}",
+@goal.put("/personal_goals/{goal_id}", response_model=GoalResponse,
           description="This endpoint edits user related goal.")
-def edit_personal_goal(
+async def edit_personal_goal(
     user: user_dependency, goal: GoalRequestModel, goal_id: int,
     db: db_dependency
 ):
     # Querying Goal with user_id and specified goal_id
-    db_goal = (
-        db.query(Goal)
-        .filter(Goal.user_id == user["id"], Goal.goal_id == goal_id)
-        .first()
+    db_goal = await db.scalar(
+        select(Goal)
+        .where(Goal.user_id == user["id"], Goal.goal_id == goal_id)
     )
     if not db_goal:
         raise HTTPException(status_code=404, detail="Goal not found")
 
     # Checking for goal_type
     if goal.goal_type_id is not None:
-        goal_type = (
-            db.query(Goal_Type)
-            .filter(Goal_Type.goal_type_id == goal.goal_type_id)
-            .first()
+        goal_type = await db.scalar(
+            select(Goal_Type)
+            .where(Goal_Type.goal_type_id == goal.goal_type_id)
         )
         if not goal_type:
             raise HTTPException(status_code=404,
@@ -197,9 +161,19 @@ def edit_personal_goal(
         if value is not None and getattr(db_goal, key) != value:
             setattr(db_goal, key, value)
 
+    # Re-saving an unchanged goal keeps its progress and every ETag
+    if not db.is_modified(db_goal):
+        return db_goal
+
     try:
-        db.commit()
-        db.refresh(db_goal)
+        # Exercises or dates may have changed, aggregates are recomputed
+        await db.flush()
+        await rebuild_goal_progress(db, Goal.goal_id == goal_id)
+        # Schedules list the exercises of their goal
+        await bump_collection_versions(db, user["id"], GOALS, SCHEDULES)
+        await db.commit()
+        await response_cache.invalidate(user["id"], GOALS, SCHEDULES)
+        await db.refresh(db_goal)
         return db_goal
     except Exception as e:
         logging.error(
@@ -208,22 +182,167 @@ def edit_personal_goal(
 
 
 # Deletability for personal goals
-@goal.delete("/personal_goals/{goal_id}",
+@goal.delete("/personal_goals/{goal_id}", response_model=MessageResponse,
              description="This endpoint deletes user related goal.")
-def delete_personal_goal(user: user_dependency, goal_id: int,
-                         db: db_dependency):
-    db_goal = (
-        db.query(Goal)
-        .filter(Goal.user_id == user["id"], Goal.goal_id == goal_id)
-        .first()
+async def delete_personal_goal(user: user_dependency, goal_id: int,
+                               db: db_dependency):
+    db_goal = await db.scalar(
+        select(Goal)
+        .where(Goal.user_id == user["id"], Goal.goal_id == goal_id)
     )
     if not db_goal:
         raise HTTPException(status_code=404, detail="Goal not found")
 
     try:
-        db.delete(db_goal)
-        db.commit()
+        await db.delete(db_goal)
+        # Schedules of the goal lose their goal_id
+        await bump_collection_versions(db, user["id"], GOALS, SCHEDULES)
+        await db.commit()
+        await response_cache.invalidate(user["id"], GOALS, SCHEDULES)
         return {"message": "Goal successfully deleted"}
     except Exception as e:
         logging.error(f"Exception Raised at delete goal function: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Batch endpoint for goals, every write of the request shares a transaction
+@goal.post("/batch", response_model=GoalBatchResponse,
+           response_model_exclude_none=True,
+           description="This endpoint creates, edits and deletes user "
+           "related goals in one transaction. Results are returned per "
+           "item, items with unknown references are skipped.")
+async def batch_goals(user: user_dependency, db: db_dependency,
+                      batch: GoalBatchRequestModel):
+    # Every referenced goal type and goal is checked with one query each
+    goal_type_ids = {
+        item.goal_type_id for item in batch.create + batch.update
+        if item.goal_type_id is not None
+    }
+    known_goal_types = set()
+    if goal_type_ids:
+        known_goal_types = set(await db.scalars(
+            select(Goal_Type.goal_type_id)
+            .where(Goal_Type.goal_type_id.in_(goal_type_ids))
+        ))
+
+    # Rows are loaded so that updates can be compared with current values
+    goal_ids = {item.goal_id for item in batch.update}.union(batch.delete)
+    owned_goals = {}
+    if goal_ids:
+        owned_goals = {
+            db_goal.goal_id: db_goal for db_goal in await db.scalars(
+                select(Goal)
+                .where(Goal.user_id == user["id"],
+                       Goal.goal_id.in_(goal_ids))
+            )
+        }
+    deleted_goals = set(owned_goals).intersection(batch.delete)
+
+    created = [None] * len(batch.create)
+    new_goals = []
+    # Column defaults are filled in here, so that every row has the same
+    # columns and the whole list goes out as a single INSERT
+    created_time = datetime.utcnow()
+    for index, item in enumerate(batch.create):
+        if item.goal_type_id not in known_goal_types:
+            created[index] = dict(index=index, status=404,
+                                  detail="Goal type not found")
+            continue
+        new_goals.append((index, dict(
+            goal_name=item.goal_name,
+            user_id=user["id"],
+            created_time=created_time,
+            start_date=item.start_date,
+            end_date=item.end_date,
+            range_min=item.range_min,
+            range_max=item.range_max,
+            selected_exercises=item.selected_exercises,
+            completed=item.completed or False,
+            goal_type_id=item.goal_type_id,
+        )))
+
+    updated = []
+    goal_changes = []
+    for index, item in enumerate(batch.update):
+        if item.goal_id not in owned_goals:
+            updated.append(dict(index=index, goal_id=item.goal_id,
+                                status=404, detail="Goal not found"))
+        elif item.goal_id in deleted_goals:
+            updated.append(dict(index=index, goal_id=item.goal_id,
+                                status=409,
+                                detail="Goal is deleted in this batch"))
+        elif (item.goal_type_id is not None
+              and item.goal_type_id not in known_goal_types):
+            updated.append(dict(index=index, goal_id=item.goal_id,
+                                status=404,
+                                detail="Specific Goal type not found"))
+        else:
+            # Same as edit_personal_goal, only given values that differ
+            # are changed. Items without any change leave the goal, its
+            # progress and the collection version alone.
+            db_goal = owned_goals[item.goal_id]
+            changes = {
+                key: value for key, value in item.dict().items()
+                if value is not None and key != "goal_id"
+                and getattr(db_goal, key) != value
+            }
+            if changes:
+                goal_changes.append(dict(changes, goal_id=item.goal_id))
+            updated.append(dict(index=index, goal_id=item.goal_id,
+                                status=200))
+
+    deleted = [
+        dict(index=index, goal_id=goal_id, status=200)
+        if goal_id in deleted_goals else
+        dict(index=index, goal_id=goal_id, status=404,
+             detail="Goal not found")
+        for index, goal_id in enumerate(batch.delete)
+    ]
+
+    try:
+        if new_goals:
+            # One multi-row INSERT, ids come back in parameter order
+            new_goal_ids = await db.scalars(
+                insert(Goal)
+                .returning(Goal.goal_id, sort_by_parameter_order=True)
+                .execution_options(render_nulls=True),
+                [row for _, row in new_goals],
+            )
+            for (index, _), goal_id in zip(new_goals, new_goal_ids):
+                created[index] = dict(index=index, goal_id=goal_id,
+                                      status=201)
+        if goal_changes:
+            # Bulk UPDATE by primary key, rows are grouped per changed columns
+            await db.execute(update(Goal), goal_changes)
+        if deleted_goals:
+            # Schedules keep existing without their goal, like an ORM delete
+            await db.execute(
+                update(Schedule)
+                .where(Schedule.goal_id.in_(deleted_goals))
+                .values(goal_id=None)
+            )
+            await db.execute(
+                delete(Goal).where(Goal.goal_id.in_(deleted_goals)))
+        changed_goals = [
+            result["goal_id"] for result in created
+            if result["status"] == 201
+        ] + [changes["goal_id"] for changes in goal_changes]
+        if changed_goals:
+            await rebuild_goal_progress(
+                db, Goal.goal_id.in_(changed_goals))
+        # Schedules show the exercises of their goal and lose deleted ones
+        changed_collections = []
+        if goal_changes or deleted_goals:
+            changed_collections = [GOALS, SCHEDULES]
+        elif changed_goals:
+            changed_collections = [GOALS]
+        if changed_collections:
+            await bump_collection_versions(
+                db, user["id"], *changed_collections)
+        await db.commit()
+        await response_cache.invalidate(user["id"], *changed_collections)
+    except Exception as e:
+        logging.error(f"Exception Raised at batch_goals(post) function: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return {"create": created, "update": updated, "delete": deleted}
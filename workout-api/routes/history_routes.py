@@ -1,26 +1,37 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import base64
+import binascii
+from datetime import datetime, timedelta
+from typing import Annotated, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+import orjson
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from database import SessionLocal
+from config import (
+    HISTORY_WRITE_BEHIND, HISTORY_BUFFER_SIZE, HISTORY_FLUSH_INTERVAL,
+)
+from database import get_db, AsyncSessionLocal
 import logging
 
-from .auth import get_current_user
-from models import User, User_History
+from .auth import get_current_user, get_current_db_user
+from form_models import (
+    HistoryEntryModel, HistoryAnalyticsResponse, MessageResponse,
+)
+from models import User, User_History, Goal, Goal_Type
+from services import (
+    add_weight_progress, rebuild_goal_progress, WEIGHT_GOAL_TARGET,
+    analytics_query, history_analytics, naive_utc, HistoryWriter,
+    bump_collection_versions, GOALS,
+)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 # user_dependency will act as login_required
 user_dependency = Annotated[dict, Depends(get_current_user)]
+# User row of the caller, loaded once per request
+db_user_dependency = Annotated[User, Depends(get_current_db_user)]
 
 
 # Section for history routes
@@ -28,32 +39,168 @@ user_dependency = Annotated[dict, Depends(get_current_user)]
 hist = APIRouter(prefix="/history", tags=["history"])
 
 
-@hist.get("/", description="This endpoint returns user related histories.")
-def get_user_history(user: user_dependency, db: db_dependency):
-    user_histories = (
-        db.query(User_History).filter(User_History.user_id == user["id"]).all()
+# Rows fetched per round trip while streaming ndjson
+HISTORY_STREAM_BATCH = 500
+# Upper bound of points returned by /history/analytics per series
+ANALYTICS_MAX_BUCKETS = 1000
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 28}
+
+# Optional write-behind buffer for history rows, started with the app
+history_writer = None
+if HISTORY_WRITE_BEHIND:
+    history_writer = HistoryWriter(HISTORY_BUFFER_SIZE,
+                                   HISTORY_FLUSH_INTERVAL)
+
+
+def history_payload(history):
+    history_dict = {}
+    history_dict["history_id"] = history.history_id
+    history_dict["created"] = history.created
+    if history.fullname_change is not None:
+        history_dict["fullname_change"] = history.fullname_change
+    if history.weight_change is not None:
+        history_dict["weight_change"] = history.weight_change
+    if history.height_change is not None:
+        history_dict["height_change"] = history.height_change
+    if history.bmi_calculation is not None:
+        history_dict["bmi_calculation"] = history.bmi_calculation
+    return history_dict
+
+
+# Cursor is the (created, history_id) key of the last row sent
+def encode_cursor(history):
+    raw = f"{history.created.isoformat()}|{history.history_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, history_id = base64.urlsafe_b64decode(
+            padded).decode().split("|")
+        return datetime.fromisoformat(created), int(history_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST,
+                            detail="Invalid cursor")
+
+
+# Keyset query on (created, history_id), newest or oldest first. Pages
+# continue past the cursor in the same direction.
+def history_query(user_id, cursor, order="newest"):
+    key = tuple_(User_History.created, User_History.history_id)
+    if order == "newest":
+        order_by = (User_History.created.desc(),
+                    User_History.history_id.desc())
+    else:
+        order_by = (User_History.created.asc(),
+                    User_History.history_id.asc())
+    query = (
+        select(User_History)
+        .where(User_History.user_id == user_id)
+        .order_by(*order_by)
     )
-    if not user_histories:
+    if cursor is not None:
+        last = decode_cursor(cursor)
+        query = query.where(key < last if order == "newest" else key > last)
+    return query
+
+
+async def stream_history(query):
+    # Own session, the request scoped one is closed before the body is sent.
+    # stream_scalars uses a server side cursor, memory stays per batch.
+    async with AsyncSessionLocal() as db:
+        histories = await db.stream_scalars(
+            query.execution_options(yield_per=HISTORY_STREAM_BATCH)
+        )
+        async for history in histories:
+            yield orjson.dumps(history_payload(history)) + b"\n"
+
+
+@hist.get("/", response_model=List[HistoryEntryModel],
+          response_model_exclude_none=True,
+          description="This endpoint returns user related histories, "
+          "newest first unless order=oldest. Pages follow the cursor from "
+          "the X-Next-Cursor header with the same order, format=ndjson "
+          "streams every row after the cursor instead.")
+async def get_user_history(
+    user: user_dependency,
+    db: db_dependency,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    response_format: Annotated[
+        Literal["json", "ndjson"], Query(alias="format")] = "json",
+    order: Literal["newest", "oldest"] = "newest",
+):
+    query = history_query(user["id"], cursor, order)
+
+    if response_format == "ndjson":
+        return StreamingResponse(
+            stream_history(query), media_type="application/x-ndjson"
+        )
+
+    # One extra row tells whether there is a next page
+    user_histories = (await db.scalars(query.limit(limit + 1))).all()
+    if not user_histories and cursor is None:
         raise HTTPException(status_code=404, detail="histories not found")
 
-    result = []
-    for history in user_histories:
-        history_dict = {}
-        history_dict["history_id"] = history.history_id
-        history_dict["created"] = history.created
-        if history.fullname_change is not None:
-            history_dict["fullname_change"] = history.fullname_change
-        if history.weight_change is not None:
-            history_dict["weight_change"] = history.weight_change
-        if history.height_change is not None:
-            history_dict["height_change"] = history.height_change
-        if history.bmi_calculation is not None:
-            history_dict["bmi_calculation"] = history.bmi_calculation
-        result.append(history_dict)
-    return result
+    if len(user_histories) > limit:
+        user_histories = user_histories[:limit]
+        next_cursor = encode_cursor(user_histories[-1])
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    # Validated from the rows by the response model, unset values dropped
+    return user_histories
+
+
+@hist.get("/analytics", response_model=HistoryAnalyticsResponse,
+          description="This endpoint returns user history downsampled into "
+          "day, week or month buckets between from and to (default: the "
+          "last 365 days), with moving averages over `window` buckets and "
+          "the slope per day of every series.")
+async def get_history_analytics(
+    user: user_dependency,
+    db: db_dependency,
+    bucket: Literal["day", "week", "month"] = "week",
+    window_start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    window_end: Annotated[Optional[datetime], Query(alias="to")] = None,
+    window: Annotated[int, Query(ge=1, le=52)] = 4,
+):
+    window_end = naive_utc(window_end) or datetime.utcnow()
+    window_start = naive_utc(window_start) or \
+        window_end - timedelta(days=365)
+    if window_end <= window_start:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="to must be later than from")
+    if (window_end - window_start).days / BUCKET_DAYS[bucket] > \
+            ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"More than {ANALYTICS_MAX_BUCKETS} buckets requested, "
+            "use a larger bucket or a shorter range",
+        )
+
+    rows = (await db.execute(
+        analytics_query(user["id"], bucket, window_start, window_end)
+    )).all()
 
+    return {
+        "bucket": bucket,
+        "from": window_start,
+        "to": window_end,
+        "window": window,
+        **history_analytics(rows, window),
+    }
 
-def add_history(
+
+# Adds a history row to the caller's unit of work, committing is left to
+# the caller. Nothing is recorded when no value changed. With the
+# write-behind buffer enabled the row is queued instead and written
+# (with its goal progress) by the buffer.
+async def add_history(
     db,
     user,
     fullname_change=None,
@@ -61,47 +208,66 @@ def add_history(
     height_change=None,
     bmi_calculation=None,
 ):
+    if fullname_change is None and weight_change is None and \
+            height_change is None and bmi_calculation is None:
+        return None
 
-    new_history = User_History(
+    row = dict(
         user_id=user.user_id,
+        created=datetime.utcnow(),
         fullname_change=fullname_change,
         weight_change=weight_change,
         height_change=height_change,
         bmi_calculation=bmi_calculation,
     )
-    try:
-        db.add(new_history)
-        db.commit()
-        db.refresh(new_history)
-        return new_history
-    except Exception as e:
-        logging.error(f"Exception raised at add_history function: {e}")
+    if history_writer is not None:
+        history_writer.add(row)
+        return None
+
+    new_history = User_History(**row)
+    db.add(new_history)
+    if weight_change is not None and await add_weight_progress(
+            db, user.user_id, weight_change, new_history.created):
+        await bump_collection_versions(db, user.user_id, GOALS)
+    return new_history
 
 
-@hist.post("/add_bmi_history/{bmi_value}",
+@hist.post("/add_bmi_history/{bmi_value}", response_model=MessageResponse,
            description="Endpoint and adds history of bmi.")
-def bmi_history_addition(user: user_dependency,
-                         db: db_dependency, bmi_value: int):
-    user_db = db.query(User).filter(User.user_id == user["id"]).first()
-    add_history(db, user_db, bmi_calculation=bmi_value)
+async def bmi_history_addition(user_db: db_user_dependency,
+                               db: db_dependency, bmi_value: int):
+    try:
+        await add_history(db, user_db, bmi_calculation=bmi_value)
+        await db.commit()
+    except Exception as e:
+        logging.error(
+            f"Exception raised at bmi_history_addition(post) function: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
     return {"message": "Bmi History Added"}
 
 
-@hist.delete("/{history_id}",
+@hist.delete("/{history_id}", response_model=MessageResponse,
              description='This endpoint removes user history by history_id')
-def delete_user_history(user: user_dependency,
-                        db: db_dependency, history_id: int):
-    history = db.query(User_History).filter(
+async def delete_user_history(user: user_dependency,
+                              db: db_dependency, history_id: int):
+    history = await db.scalar(select(User_History).where(
         User_History.user_id == user["id"],
         User_History.history_id == history_id
-    ).first()
+    ))
 
     if not history:
         raise HTTPException(status_code=404, detail="history not found")
 
     try:
-        db.delete(history)
-        db.commit()
+        await db.delete(history)
+        if history.weight_change is not None:
+            # Weight goals may have started from or ended at this row
+            await db.flush()
+            await rebuild_goal_progress(
+                db, Goal.user_id == user["id"],
+                Goal_Type.goal_target == WEIGHT_GOAL_TARGET)
+            await bump_collection_versions(db, user["id"], GOALS)
+        await db.commit()
     except Exception as e:
         logging.error(f"Exception raised at delete history function: {e}")
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
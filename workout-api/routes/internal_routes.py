@@ -0,0 +1,74 @@
+import secrets
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from starlette import status
+
+from config import INTERNAL_API_TOKEN
+from database import pool_stats
+from services import response_cache
+from .auth import password_hasher, token_cache, user_cache, login_throttle
+from . import history_routes
+
+
+# Operational endpoints, only reachable with the shared internal token
+def require_internal_token(
+    x_internal_token: Annotated[Optional[str], Header()] = None
+):
+    if not INTERNAL_API_TOKEN or x_internal_token is None or \
+            not secrets.compare_digest(x_internal_token, INTERNAL_API_TOKEN):
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+internal = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal_token)],
+)
+
+
+@internal.get(
+    "/db_pool",
+    description="Connection pool usage and connection wait times",
+)
+async def db_pool():
+    return pool_stats()
+
+
+@internal.get(
+    "/auth",
+    description="Auth caches and password hashing executor stats",
+)
+async def auth_stats():
+    return {
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "login_throttle": login_throttle.stats(),
+    }
+
+
+@internal.get(
+    "/startup",
+    description="Time spent in each startup step of this worker, seconds",
+)
+async def startup_timings(request: Request):
+    return getattr(request.app.state, "startup_timings", {})
+
+
+@internal.get(
+    "/history_writer",
+    description="History write-behind buffer stats, null when disabled",
+)
+async def history_writer_stats():
+    if history_routes.history_writer is None:
+        return None
+    return history_routes.history_writer.stats()
+
+
+@internal.get(
+    "/response_cache",
+    description="Per-user response cache hit ratio and latency",
+)
+async def response_cache_stats():
+    return response_cache.stats()
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from database import pool_stats
+from services import (
+    request_metrics, render_prometheus, stats_families, response_cache,
+)
+from .auth import password_hasher, token_cache, user_cache, login_throttle
+from .internal_routes import require_internal_token
+from . import history_routes
+
+
+# Prometheus scrape endpoint, only mounted when METRICS_ENABLED is set.
+# Guarded like /internal/*, scrapers send the X-Internal-Token header.
+metrics = APIRouter(
+    tags=["metrics"],
+    include_in_schema=False,
+    dependencies=[Depends(require_internal_token)],
+)
+
+
+@metrics.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    description="Request, SQL, pool, cache and hashing metrics of this "
+    "worker in the Prometheus text format",
+)
+async def prometheus_metrics():
+    families = request_metrics.families()
+    families += stats_families("db_pool", pool_stats())
+    families += stats_families("response_cache", response_cache.stats())
+    families += stats_families("token_cache", token_cache.stats())
+    families += stats_families("user_cache", user_cache.stats())
+    families += stats_families("password_hasher", password_hasher.stats())
+    families += stats_families("login_throttle", login_throttle.stats())
+    if history_routes.history_writer is not None:
+        families += stats_families(
+            "history_writer", history_routes.history_writer.stats())
+    return PlainTextResponse(
+        render_prometheus(families),
+        media_type="text/plain; version=0.0.4",
+    )
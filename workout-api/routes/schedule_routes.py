@@ -1,29 +1,39 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import base64
+import binascii
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 from starlette import status
-from database import SessionLocal
+from config import SCHEDULE_WINDOW_MAX_DAYS
+from database import get_db
 import logging
 
-from .auth import get_current_user
-from form_models import ScheduleRequestModel
+from .auth import get_current_user, get_current_db_user
+from form_models import (
+    ScheduleRequestModel, ScheduleBatchRequestModel, ScheduleCreatedResponse,
+    PersonalSchedulesResponse, ScheduleResponse, ScheduleOccurrencesResponse,
+    CalendarResponse, ScheduleBatchResponse, MessageResponse,
+)
 from models import (
     User, Goal, Schedule,
 )
+from services import (
+    CronError, naive_utc, schedule_occurrences, merge_occurrences,
+    bump_collection_versions, SCHEDULES,
+    response_cache, collection_response, render_json,
+)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 # user_dependency will act as login_required
 user_dependency = Annotated[dict, Depends(get_current_user)]
+# User row of the caller, loaded once per request
+db_user_dependency = Annotated[User, Depends(get_current_db_user)]
 
 
 # Section For Schedule Routes, For Getting, Posting, Editing and Deleting
@@ -33,18 +43,15 @@ schedule = APIRouter(prefix="/schedule", tags=["schedules"])
 
 @schedule.post(
     "/create_schedule",
+    response_model=ScheduleCreatedResponse,
     description="This endpoint creates a user related schedule"
 )
-def create_schedule(
-    user: user_dependency, db: db_dependency, schedule: ScheduleRequestModel
+async def create_schedule(
+    user: db_user_dependency, db: db_dependency,
+    schedule: ScheduleRequestModel
 ):
-    # Querring current user
-    user = db.query(User).filter(User.user_id == user["id"]).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User Not Found"
-        )
-    goal = db.query(Goal).filter(Goal.goal_id == schedule.goal_id).first()
+    goal = await db.scalar(
+        select(Goal).where(Goal.goal_id == schedule.goal_id))
     if goal:
         selected_exercises = list(
             set(goal.selected_exercises).union(schedule.selected_exercises)
@@ -73,8 +80,10 @@ def create_schedule(
         )
     try:
         db.add(new_schedule)
-        db.commit()
-        db.refresh(new_schedule)
+        await bump_collection_versions(db, user.user_id, SCHEDULES)
+        await db.commit()
+        await response_cache.invalidate(user.user_id, SCHEDULES)
+        await db.refresh(new_schedule)
         return {"Request Succesful": "Schedule entry has been added"}
 
     except Exception as e:
@@ -83,12 +92,16 @@ def create_schedule(
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@schedule.get(
-    "/user_schedules/",
-    description="This endpoint querries user related schedules"
-)
-def get_personal_schedules(user: user_dependency, db: db_dependency):
-    schedules = db.query(Schedule).filter(Schedule.user_id == user["id"]).all()
+async def personal_schedules_body(db, user_id):
+    # Goals come with their schedules in the same query, one round trip
+    # no matter how many schedules the user has
+    schedules = (await db.scalars(
+        select(Schedule)
+        .outerjoin(Schedule.goal)
+        .options(contains_eager(Schedule.goal))
+        .where(Schedule.user_id == user_id)
+        .order_by(Schedule.schedule_id)
+    )).all()
     if not schedules:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND,
@@ -97,16 +110,11 @@ def get_personal_schedules(user: user_dependency, db: db_dependency):
 
     schedules_dict = []
     for schedule in schedules:
-        if schedule.goal_id:
-            goal = db.query(Goal).filter(
-                Goal.goal_id == schedule.goal_id).first()
-            if goal:
-                selected_exercises = list(
-                    set(goal.selected_exercises).union(
-                        schedule.selected_exercises)
-                )
-            else:
-                selected_exercises = schedule.selected_exercises
+        if schedule.goal is not None:
+            selected_exercises = list(
+                set(schedule.goal.selected_exercises or []).union(
+                    schedule.selected_exercises or [])
+            )
         else:
             selected_exercises = schedule.selected_exercises
 
@@ -124,46 +132,73 @@ def get_personal_schedules(user: user_dependency, db: db_dependency):
             )
         )
 
-    return {"schedules": schedules_dict}
+    return render_json(PersonalSchedulesResponse,
+                       {"schedules": schedules_dict})
+
+
+@schedule.get(
+    "/user_schedules/",
+    response_model=PersonalSchedulesResponse,
+    description="This endpoint querries user related schedules. "
+    "Supports If-None-Match."
+)
+async def get_personal_schedules(user: user_dependency, db: db_dependency,
+                                 request: Request):
+    # Unchanged schedules are answered from the collection version alone,
+    # otherwise from the response cache while it holds this version
+    return await collection_response(
+        request, db, user["id"], SCHEDULES,
+        lambda: personal_schedules_body(db, user["id"]))
 
 
 @schedule.put(
     "/user_schedules/{schedule_id}",
+    response_model=ScheduleResponse,
     description="This endpoint edits user related schedule by schedule_id",
 )
-def edit_personal_schedule(
+async def edit_personal_schedule(
     user: user_dependency,
     schedule: ScheduleRequestModel,
     schedule_id: int,
     db: db_dependency,
 ):
     # Querying Schedule with user_id and specified schedule_id
-    db_schedule = (
-        db.query(Schedule)
-        .filter(Schedule.user_id == user["id"],
-                Schedule.schedule_id == schedule_id)
-        .first()
+    db_schedule = await db.scalar(
+        select(Schedule)
+        .where(Schedule.user_id == user["id"],
+               Schedule.schedule_id == schedule_id)
     )
 
     if not db_schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
 
     if schedule.goal_id:
-        goal = db.query(Goal).filter(Goal.goal_id == schedule.goal_id).first()
+        goal = await db.scalar(
+            select(Goal).where(Goal.goal_id == schedule.goal_id))
         if goal:
-            selected_exercises = list(
-                set(goal.selected_exercises).union(schedule.selected_exercises)
-            )
-            schedule.selected_exercises = selected_exercises
+            selected_exercises = set(goal.selected_exercises or []).union(
+                schedule.selected_exercises or [])
+            # Merged from a set, the stored order is kept when unchanged
+            if selected_exercises == set(
+                    db_schedule.selected_exercises or []):
+                schedule.selected_exercises = None
+            else:
+                schedule.selected_exercises = list(selected_exercises)
 
     # Iterating over the changes and update the schedule data
     for attr, value in schedule.dict().items():
         if value is not None:
             setattr(db_schedule, attr, value)
 
+    # Re-saving an unchanged schedule keeps every ETag
+    if not db.is_modified(db_schedule):
+        return db_schedule
+
     try:
-        db.commit()
-        db.refresh(db_schedule)
+        await bump_collection_versions(db, user["id"], SCHEDULES)
+        await db.commit()
+        await response_cache.invalidate(user["id"], SCHEDULES)
+        await db.refresh(db_schedule)
         return db_schedule
     except Exception as e:
         logging.error(
@@ -173,27 +208,365 @@ def edit_personal_schedule(
 
 @schedule.delete(
     "/user_schedules/{schedule_id}",
+    response_model=MessageResponse,
     description="This endpoint deletes user related schedule by schedule_id",
 )
-def delete_personal_schedule(
+async def delete_personal_schedule(
     user: user_dependency, schedule_id: int, db: db_dependency
 ):
-    schedule = (
-        db.query(Schedule)
-        .filter(Schedule.user_id == user["id"],
-                Schedule.schedule_id == schedule_id)
-        .first()
+    schedule = await db.scalar(
+        select(Schedule)
+        .where(Schedule.user_id == user["id"],
+               Schedule.schedule_id == schedule_id)
     )
 
     if not schedule:
         raise HTTPException(status_code=404, detail="schedule not found")
 
     try:
-        db.delete(schedule)
-        db.commit()
+        await db.delete(schedule)
+        await bump_collection_versions(db, user["id"], SCHEDULES)
+        await db.commit()
+        await response_cache.invalidate(user["id"], SCHEDULES)
         return {"message": "Goal successfully deleted"}
     except Exception as e:
         logging.error(
             f"Exception raised at delete schedule(delete) function: {e}"
         )
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# from and to of an expanded window, naive utc. Defaults to the next 31
+# days, longer windows than SCHEDULE_WINDOW_MAX_DAYS are refused since
+# expansion walks every day of the window.
+def occurrence_window(window_start, window_end):
+    window_start = naive_utc(window_start) or datetime.utcnow()
+    window_end = naive_utc(window_end) or window_start + min(
+        timedelta(days=31), datetime.max - window_start)
+    if window_end <= window_start:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="to must be later than from")
+    if window_end - window_start > timedelta(days=SCHEDULE_WINDOW_MAX_DAYS):
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail=f"from and to may be at most {SCHEDULE_WINDOW_MAX_DAYS} "
+            "days apart")
+    return window_start, window_end
+
+
+@schedule.get(
+    "/user_schedules/{schedule_id}/occurrences",
+    response_model=ScheduleOccurrencesResponse,
+    description="This endpoint expands the schedule crontab_value into "
+    "occurrences between from and to (default: now and 31 days later), "
+    "clipped to the schedule start_date and end_date. The window may span "
+    "at most SCHEDULE_WINDOW_MAX_DAYS days",
+)
+async def get_schedule_occurrences(
+    user: user_dependency,
+    schedule_id: int,
+    db: db_dependency,
+    window_start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    window_end: Annotated[Optional[datetime], Query(alias="to")] = None,
+    limit: Annotated[int, Query(ge=1, le=10000)] = 1000,
+):
+    db_schedule = await db.scalar(
+        select(Schedule)
+        .where(Schedule.user_id == user["id"],
+               Schedule.schedule_id == schedule_id)
+    )
+    if not db_schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    if not db_schedule.crontab_value:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Schedule has no crontab_value")
+
+    window_start, window_end = occurrence_window(window_start, window_end)
+
+    try:
+        occurrences = schedule_occurrences(
+            db_schedule.crontab_value,
+            db_schedule.start_date,
+            db_schedule.end_date,
+            window_start,
+            window_end,
+        )
+    except CronError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"Invalid crontab_value: {e}")
+
+    # Generation is lazy, only limit + 1 occurrences are ever built
+    page = list(islice(occurrences, limit + 1))
+    next_from = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_from = page[-1] + timedelta(minutes=1)
+
+    return {
+        "schedule_id": db_schedule.schedule_id,
+        "crontab_value": db_schedule.crontab_value,
+        "from": window_start,
+        "to": window_end,
+        "occurrences": page,
+        "next_from": next_from,
+    }
+
+
+# Calendar cursor is the (occurrence, schedule_id) key of the last event sent
+def encode_calendar_cursor(when, schedule_id):
+    raw = f"{when.isoformat()}|{schedule_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_calendar_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        when, schedule_id = base64.urlsafe_b64decode(
+            padded).decode().split("|")
+        return datetime.fromisoformat(when), int(schedule_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST,
+                            detail="Invalid cursor")
+
+
+@schedule.get(
+    "/calendar",
+    response_model=CalendarResponse,
+    description="This endpoint merges the occurrences of all user schedules "
+    "between from and to into one timeline, oldest first. Pages follow the "
+    "cursor from next_cursor or the X-Next-Cursor header. The window may "
+    "span at most SCHEDULE_WINDOW_MAX_DAYS days",
+)
+async def get_schedule_calendar(
+    user: user_dependency,
+    db: db_dependency,
+    request: Request,
+    response: Response,
+    window_start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    window_end: Annotated[Optional[datetime], Query(alias="to")] = None,
+    cursor: Optional[str] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    # Bounded like a single schedule, every schedule walks the window
+    window_start, window_end = occurrence_window(window_start, window_end)
+
+    after = None
+    start = window_start
+    if cursor is not None:
+        after = decode_calendar_cursor(cursor)
+        start = max(start, after[0])
+
+    # Only schedules that can have occurrences inside the window
+    schedules = (await db.scalars(
+        select(Schedule)
+        .where(
+            Schedule.user_id == user["id"],
+            Schedule.crontab_value.is_not(None),
+            Schedule.crontab_value != "",
+            or_(Schedule.start_date.is_(None),
+                Schedule.start_date < window_end),
+            or_(Schedule.end_date.is_(None), Schedule.end_date >= start),
+        )
+        .order_by(Schedule.schedule_id)
+    )).all()
+
+    by_id = {}
+    streams = []
+    for db_schedule in schedules:
+        try:
+            occurrences = schedule_occurrences(
+                db_schedule.crontab_value,
+                db_schedule.start_date,
+                db_schedule.end_date,
+                start,
+                window_end,
+            )
+        except CronError as e:
+            # Rows stored before crontab_value was validated
+            logging.warning(
+                f"Skipping schedule {db_schedule.schedule_id} in calendar, "
+                f"invalid crontab_value: {e}")
+            continue
+        by_id[db_schedule.schedule_id] = db_schedule
+        streams.append((db_schedule.schedule_id, occurrences))
+
+    events = merge_occurrences(streams)
+    if after is not None:
+        # Events sharing the cursor minute were partly sent already
+        events = (event for event in events if event > after)
+    # Generation is lazy, only limit + 1 events are ever built
+    page = list(islice(events, limit + 1))
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_calendar_cursor(*page[-1])
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+    return {
+        "from": window_start,
+        "to": window_end,
+        "events": [
+            dict(
+                at=when,
+                schedule_id=schedule_id,
+                goal_id=by_id[schedule_id].goal_id,
+                note=by_id[schedule_id].note,
+            )
+            for when, schedule_id in page
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+# Batch endpoint for schedules, every write of the request shares a
+# transaction
+@schedule.post(
+    "/batch",
+    response_model=ScheduleBatchResponse,
+    response_model_exclude_none=True,
+    description="This endpoint creates, edits and deletes user related "
+    "schedules in one transaction. Results are returned per item, items "
+    "with unknown references are skipped.",
+)
+async def batch_schedules(user: user_dependency, db: db_dependency,
+                          batch: ScheduleBatchRequestModel):
+    # Every referenced goal and schedule is checked with one query each
+    goal_ids = {
+        item.goal_id for item in batch.create + batch.update
+        if item.goal_id is not None
+    }
+    goal_exercises = {}
+    if goal_ids:
+        goal_exercises = {
+            goal_id: selected_exercises
+            for goal_id, selected_exercises in await db.execute(
+                select(Goal.goal_id, Goal.selected_exercises)
+                .where(Goal.user_id == user["id"],
+                       Goal.goal_id.in_(goal_ids))
+            )
+        }
+
+    schedule_ids = {
+        item.schedule_id for item in batch.update}.union(batch.delete)
+    # Rows are loaded so that updates can be compared with current values
+    owned_schedules = {}
+    if schedule_ids:
+        owned_schedules = {
+            db_schedule.schedule_id: db_schedule
+            for db_schedule in await db.scalars(
+                select(Schedule)
+                .where(Schedule.user_id == user["id"],
+                       Schedule.schedule_id.in_(schedule_ids))
+            )
+        }
+    deleted_schedules = set(owned_schedules).intersection(batch.delete)
+
+    # Same merge as create_schedule, goal exercises are added to the
+    # selected ones
+    def merged_exercises(item):
+        if item.goal_id is None:
+            return item.selected_exercises
+        return list(set(goal_exercises[item.goal_id] or []).union(
+            item.selected_exercises or []))
+
+    created = [None] * len(batch.create)
+    new_schedules = []
+    # Column defaults are filled in here, so that every row has the same
+    # columns and the whole list goes out as a single INSERT
+    for index, item in enumerate(batch.create):
+        if item.goal_id is not None and item.goal_id not in goal_exercises:
+            created[index] = dict(index=index, status=404,
+                                  detail="Goal not found")
+            continue
+        new_schedules.append((index, dict(
+            goal_id=item.goal_id,
+            user_id=user["id"],
+            start_date=item.start_date,
+            end_date=item.end_date,
+            selected_exercises=merged_exercises(item),
+            note=item.note or "",
+            extended_note=item.extended_note or "",
+            crontab_value=item.crontab_value or "",
+        )))
+
+    updated = []
+    schedule_changes = []
+    for index, item in enumerate(batch.update):
+        result = dict(index=index, schedule_id=item.schedule_id)
+        if item.schedule_id not in owned_schedules:
+            updated.append(dict(result, status=404,
+                                detail="Schedule not found"))
+        elif item.schedule_id in deleted_schedules:
+            updated.append(dict(result, status=409,
+                                detail="Schedule is deleted in this batch"))
+        elif item.goal_id is not None and item.goal_id not in goal_exercises:
+            updated.append(dict(result, status=404, detail="Goal not found"))
+        else:
+            # Same as edit_personal_schedule, only given values that differ
+            # are changed. Items without any change leave the collection
+            # version alone.
+            db_schedule = owned_schedules[item.schedule_id]
+            values = {
+                key: value for key, value in item.dict().items()
+                if value is not None and key != "schedule_id"
+            }
+            if item.goal_id is not None:
+                values["selected_exercises"] = merged_exercises(item)
+            changes = {
+                key: value for key, value in values.items()
+                if getattr(db_schedule, key) != value
+            }
+            # Merged exercises come from a set, their order is arbitrary
+            if item.goal_id is not None and "selected_exercises" in changes \
+                    and set(db_schedule.selected_exercises or []) == \
+                    set(changes["selected_exercises"]):
+                del changes["selected_exercises"]
+            if changes:
+                schedule_changes.append(
+                    dict(changes, schedule_id=item.schedule_id))
+            updated.append(dict(result, status=200))
+
+    deleted = [
+        dict(index=index, schedule_id=schedule_id, status=200)
+        if schedule_id in deleted_schedules else
+        dict(index=index, schedule_id=schedule_id, status=404,
+             detail="Schedule not found")
+        for index, schedule_id in enumerate(batch.delete)
+    ]
+
+    try:
+        if new_schedules:
+            # One multi-row INSERT, ids come back in parameter order
+            new_schedule_ids = await db.scalars(
+                insert(Schedule)
+                .returning(Schedule.schedule_id, sort_by_parameter_order=True)
+                .execution_options(render_nulls=True),
+                [row for _, row in new_schedules],
+            )
+            for (index, _), schedule_id in zip(new_schedules,
+                                               new_schedule_ids):
+                created[index] = dict(index=index, schedule_id=schedule_id,
+                                      status=201)
+        if schedule_changes:
+            # Bulk UPDATE by primary key, rows are grouped per changed columns
+            await db.execute(update(Schedule), schedule_changes)
+        if deleted_schedules:
+            await db.execute(
+                delete(Schedule)
+                .where(Schedule.schedule_id.in_(deleted_schedules))
+            )
+        changed = bool(new_schedules or schedule_changes or deleted_schedules)
+        if changed:
+            await bump_collection_versions(db, user["id"], SCHEDULES)
+        await db.commit()
+        if changed:
+            await response_cache.invalidate(user["id"], SCHEDULES)
+    except Exception as e:
+        logging.error(
+            f"Exception raised at batch_schedules(post) function: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return {"create": created, "update": updated, "delete": deleted}
@@ -1,29 +1,31 @@
-from .auth import get_current_user
+from .auth import (
+    get_current_user, get_current_db_user, get_current_db_user_for_update,
+    user_cache,
+)
 from .history_routes import add_history
 from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from database import SessionLocal
+from database import get_db
 import logging
 
 from models import User
-from form_models import ChangeUserDataRequest
-
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from form_models import (
+    ChangeUserDataRequest, UserDataResponse, UserDataChangedResponse,
+)
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 
 # user_dependency will act as login_required
 user_dependency = Annotated[dict, Depends(get_current_user)]
+# User row of the caller, loaded once per request
+db_user_dependency = Annotated[User, Depends(get_current_db_user)]
+# Fresh and locked User row, for handlers that update it
+db_user_for_update_dependency = Annotated[
+    User, Depends(get_current_db_user_for_update)]
 
 
 # For user management
@@ -33,15 +35,11 @@ user_route = APIRouter(prefix="/user", tags=["user"])
 
 @user_route.get(
     "/",
+    response_model=UserDataResponse,
     status_code=status.HTTP_200_OK,
     description="This endpoint Gets current user data",
 )
-def user_data(user: user_dependency, db: db_dependency):
-    user_db = db.query(User).filter(User.user_id == user["id"]).first()
-    if user_db is None:
-        raise HTTPException(
-            status.HTTP_401_UNAUTHORIZED, detail="Authentification Failed"
-        )
+async def user_data(user: user_dependency, user_db: db_user_dependency):
     return {
         "User": user,
         "fullname": user_db.fullname,
@@ -52,17 +50,13 @@ def user_data(user: user_dependency, db: db_dependency):
 
 @user_route.put(
         "/data_change",
+        response_model=UserDataChangedResponse,
         description="This endpoint edits current user data"
         )
-def change_user_data(
-    user: user_dependency, db: db_dependency,
+async def change_user_data(
+    user: db_user_for_update_dependency, db: db_dependency,
     user_request: ChangeUserDataRequest
 ):
-    user = db.query(User).filter(User.user_id == user["id"]).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
 
     # Map the fields to their corresponding changes
     changes = {
@@ -88,15 +82,17 @@ def change_user_data(
             elif field == "height":
                 height_change = value
 
-    # Add the changes to the User_History table
-    add_history(db, user, fullname_change, weight_change, height_change)
-
     try:
-        db.commit()
+        # The history row is committed together with the user update
+        await add_history(
+            db, user, fullname_change, weight_change, height_change)
+        await db.commit()
         return {"Request Successfull": "User Data has been changed"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logging.error(
             f"Exception raised at change_user_data(put) function: {e}"
             )
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+    finally:
+        user_cache.invalidate(user.user_id)
@@ -0,0 +1,221 @@
+from datetime import datetime
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from config import WORKOUT_SET_BATCH_MAX, WORKOUT_SET_BODY_MAX
+from database import get_db
+import logging
+import orjson
+
+from .auth import get_current_user
+from form_models import WorkoutSetRequestModel, WorkoutSetBatchResponse
+from models import Schedule
+from services import (
+    add_set_progress, catalog, naive_utc, write_workout_sets,
+    bump_collection_versions, GOALS,
+)
+
+
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+# user_dependency will act as login_required
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# Section for performed workout sets
+
+workout_set = APIRouter(prefix="/workout_sets", tags=["workout sets"])
+
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/jsonl"}
+
+
+# Marks NDJSON lines that are not valid JSON, already reported as errors
+UNDECODED = object()
+
+
+def too_many_sets():
+    return HTTPException(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"At most {WORKOUT_SET_BATCH_MAX} sets per request",
+    )
+
+
+def body_too_large():
+    return HTTPException(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"At most {WORKOUT_SET_BODY_MAX} bytes per request",
+    )
+
+
+# Body chunks as they are received, refused once the body grows past
+# WORKOUT_SET_BODY_MAX bytes, or right away when Content-Length says so
+async def limited_stream(request):
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > WORKOUT_SET_BODY_MAX:
+        raise body_too_large()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > WORKOUT_SET_BODY_MAX:
+            raise body_too_large()
+        yield chunk
+
+
+async def read_body(request):
+    return b"".join([chunk async for chunk in limited_stream(request)])
+
+
+# NDJSON bodies are split into lines while they are received, the set
+# limit is enforced before the whole body is buffered. Only the new bytes
+# of each chunk are scanned, a line spanning chunks is joined once.
+async def read_ndjson_lines(request):
+    lines = []
+    pending = []
+
+    def add_line(line):
+        if line.strip():
+            if len(lines) >= WORKOUT_SET_BATCH_MAX:
+                raise too_many_sets()
+            lines.append(line)
+
+    async for chunk in limited_stream(request):
+        *complete, rest = chunk.split(b"\n")
+        if complete:
+            add_line(b"".join(pending) + complete[0])
+            for line in complete[1:]:
+                add_line(line)
+            pending = []
+        pending.append(rest)
+    add_line(b"".join(pending))
+    return lines
+
+
+async def read_workout_sets(request):
+    media_type = request.headers.get("content-type", "").split(";")[0]
+    errors = []
+    if media_type.strip().lower() in NDJSON_MEDIA_TYPES:
+        values = []
+        for index, line in enumerate(await read_ndjson_lines(request)):
+            try:
+                values.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                values.append(UNDECODED)
+                errors.append({"type": "json_invalid", "loc": ("body", index),
+                               "msg": "JSON decode error"})
+    else:
+        try:
+            values = orjson.loads(await read_body(request))
+        except orjson.JSONDecodeError:
+            raise RequestValidationError([{
+                "type": "json_invalid", "loc": ("body",),
+                "msg": "JSON decode error"}])
+        if not isinstance(values, list):
+            raise RequestValidationError([{
+                "type": "list_type", "loc": ("body",),
+                "msg": "Input should be a valid list"}])
+        if len(values) > WORKOUT_SET_BATCH_MAX:
+            raise too_many_sets()
+
+    workout_sets = []
+    for index, value in enumerate(values):
+        # A null item is not skipped, it fails validation at its index
+        if value is UNDECODED:
+            continue
+        try:
+            workout_sets.append(
+                (index, WorkoutSetRequestModel.model_validate(value)))
+        except ValidationError as e:
+            errors.extend(
+                dict(error, loc=("body", index) + tuple(error["loc"]))
+                for error in e.errors(include_url=False)
+            )
+    if errors:
+        raise RequestValidationError(errors)
+    return workout_sets
+
+
+@workout_set.post(
+    "/batch",
+    response_model=WorkoutSetBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    description="This endpoint records performed sets in bulk. The body is "
+    "a json array or NDJSON (application/x-ndjson), one set per line. "
+    "The batch is written in one transaction or rejected as a whole.",
+    # The body is parsed by hand to accept both formats, documented here
+    openapi_extra={"requestBody": {"required": True, "content": {
+        media_type: {"schema": {
+            "type": "array",
+            "items": WorkoutSetRequestModel.model_json_schema(),
+        }}
+        for media_type in ("application/json", "application/x-ndjson")
+    }}},
+)
+async def add_workout_sets(user: user_dependency, db: db_dependency,
+                           request: Request):
+    workout_sets = await read_workout_sets(request)
+    if not workout_sets:
+        return {"inserted": 0}
+
+    # References are checked per distinct id, exercises from the catalog
+    # and the user's schedules with one query
+    exercise_ids = {item.exercise_id for _, item in workout_sets}
+    missing_exercises = {
+        exercise_id for exercise_id in exercise_ids
+        if await catalog.exercise(exercise_id) is None
+    }
+    schedule_ids = {
+        item.schedule_id for _, item in workout_sets
+        if item.schedule_id is not None
+    }
+    owned_schedules = set()
+    if schedule_ids:
+        owned_schedules = set(await db.scalars(
+            select(Schedule.schedule_id)
+            .where(Schedule.user_id == user["id"],
+                   Schedule.schedule_id.in_(schedule_ids))
+        ))
+
+    errors = []
+    for index, item in workout_sets:
+        if item.exercise_id in missing_exercises:
+            errors.append({"type": "not_found",
+                           "loc": ("body", index, "exercise_id"),
+                           "msg": "Exercise not found"})
+        if (item.schedule_id is not None
+                and item.schedule_id not in owned_schedules):
+            errors.append({"type": "not_found",
+                           "loc": ("body", index, "schedule_id"),
+                           "msg": "Schedule not found"})
+    if errors:
+        raise RequestValidationError(errors)
+
+    now = datetime.utcnow()
+    rows = [
+        (
+            user["id"],
+            item.exercise_id,
+            item.schedule_id,
+            naive_utc(item.performed_at) or now,
+            item.value_1,
+            item.value_2,
+            item.weight,
+        )
+        for _, item in workout_sets
+    ]
+    try:
+        await write_workout_sets(db, rows)
+        # Goal aggregates are updated in the same transaction
+        if await add_set_progress(db, user["id"], rows):
+            await bump_collection_versions(db, user["id"], GOALS)
+        await db.commit()
+    except Exception as e:
+        logging.error(
+            f"Exception raised at add_workout_sets(post) function: {e}")
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return {"inserted": len(rows)}
@@ -0,0 +1,126 @@
+import logging
+import os
+from datetime import datetime
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, select, text, tuple_
+from sqlalchemy.dialects.postgresql import array
+
+from database import engine
+from models import Goal, Schedule, User_History
+
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "alembic.ini")
+# Revision matching the tables create_all used to build
+INITIAL_REVISION = "0001"
+
+
+def alembic_config(connection=None):
+    config = Config(ALEMBIC_INI)
+    config.set_main_option(
+        "script_location",
+        os.path.join(os.path.dirname(__file__), "migrations"),
+    )
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+# Brings the schema to the latest revision. Databases created by the old
+# create_all bootstrap have tables but no alembic_version, those are
+# stamped at the initial revision first so only newer migrations run.
+def upgrade_database(connection=None):
+    if connection is None:
+        with engine.begin() as connection:
+            return upgrade_database(connection)
+
+    config = alembic_config(connection)
+    inspector = inspect(connection)
+    if inspector.has_table("users") and \
+            not inspector.has_table("alembic_version"):
+        logging.info(f"Stamping existing schema at {INITIAL_REVISION}")
+        command.stamp(config, INITIAL_REVISION)
+    command.upgrade(config, "head")
+
+
+# Same statements the per-user routes run, with a sample user id
+def hot_path_queries(user_id=1, exercise_id=1):
+    return {
+        "goal_routes.get_personal_goals": (
+            "goals",
+            select(Goal)
+            .where(Goal.user_id == user_id)
+            .order_by(Goal.start_date.asc(), Goal.created_time.asc()),
+        ),
+        "goal_routes.edit_personal_goal": (
+            "goals",
+            select(Goal).where(Goal.user_id == user_id, Goal.goal_id == 1),
+        ),
+        "goals by selected exercise": (
+            "goals",
+            select(Goal.goal_id).where(
+                Goal.user_id == user_id,
+                Goal.selected_exercises.op("&&")(array([exercise_id])),
+            ),
+        ),
+        "schedule_routes.get_personal_schedules": (
+            "schedules",
+            select(Schedule).where(Schedule.user_id == user_id),
+        ),
+        "schedule_routes.edit_personal_schedule": (
+            "schedules",
+            select(Schedule).where(
+                Schedule.user_id == user_id, Schedule.schedule_id == 1),
+        ),
+        "history_routes.get_user_history": (
+            "user_history",
+            select(User_History)
+            .where(
+                User_History.user_id == user_id,
+                tuple_(User_History.created, User_History.history_id)
+                > (datetime(2000, 1, 1), 0),
+            )
+            .order_by(User_History.created.asc(),
+                      User_History.history_id.asc())
+            .limit(101),
+        ),
+    }
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+# Runs EXPLAIN for every hot path query and reports whether the main table
+# is read through an index. Sequential scans are disabled for the check,
+# on near empty tables the planner would otherwise prefer them anyway.
+def explain_hot_paths():
+    results = {}
+    with engine.connect() as connection:
+        connection.execute(text("SET enable_seqscan = off"))
+        for name, (table, query) in hot_path_queries().items():
+            compiled = query.compile(
+                connection, compile_kwargs={"literal_binds": True})
+            plan = connection.execute(
+                text(f"EXPLAIN (FORMAT JSON) {compiled}")
+            ).scalar()[0]["Plan"]
+            scans = [
+                node for node in plan_nodes(plan)
+                if node.get("Relation Name") == table
+            ]
+            results[name] = {
+                "table": table,
+                "scans": [node["Node Type"] for node in scans],
+                "indexes": [
+                    node["Index Name"] for node in plan_nodes(plan)
+                    if "Index Name" in node
+                ],
+                "uses_index": bool(scans) and all(
+                    node["Node Type"] != "Seq Scan" for node in scans
+                ),
+            }
+        connection.rollback()
+    return results
@@ -1,9 +1,7 @@
-from database import SessionLocal
-from models import Exercise, Exercise_Type, Exercise_Unit, Goal_Type
-
-import logging
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
 
-db = SessionLocal()
+from models import Exercise, Exercise_Type, Exercise_Unit, Goal_Type
 
 
 # Exercise Type Data for easy filtering
@@ -236,66 +234,41 @@ exercises_data = [
 ]
 
 
-def populate_exercise(exercise_data, db=db):
-    try:
-        exercise_query = db.query(Exercise).first()
-        if exercise_query is None:
-            if exercise_data:
-                for exercise in exercise_data:
-                    new_exercise = Exercise(**exercise)
-                    db.add(new_exercise)
-
-            db.commit()
-    except Exception as e:
-        logging.error(e)
-        db.rollback()
-
-
-def populate_exercise_type(exercise_type_data, db=db):
-    try:
-
-        exercise_type_query = db.query(Exercise_Type).first()
-        if exercise_type_query is None:
-            if exercise_type_data:
-                for exercise_type in exercise_type_data:
-                    new_exercise_type = Exercise_Type(**exercise_type)
-                    db.add(new_exercise_type)
-            db.commit()
-    except Exception as e:
-        logging.warning(e)
-
-
-def populate_exercise_unit(exercise_unit_type_data, db=db):
-    try:
-        exercise_unit_type = db.query(Exercise_Unit).first()
-        if exercise_unit_type is None:
-            if exercise_unit_type_data:
-                for exercise_unit_data in exercise_unit_type_data:
-                    new_exercise_unit_type = Exercise_Unit(
-                        **exercise_unit_data)
-                    db.add(new_exercise_unit_type)
-            db.commit()
-    except Exception as e:
-        logging.warning(e)
-
-
-def populate_goal_type(goal_types, db=db):
-    try:
-        goal_type_query = db.query(Goal_Type).first()
-        if goal_type_query is None:
-            if goal_types:
-                for goal_type in goal_types:
-                    new_goal_type = Goal_Type(**goal_type)
-                    db.add(new_goal_type)
-            db.commit()
-    except Exception as e:
-        logging.warning(e)
-
+# Reference tables in foreign key order with their seed rows.
+# Rows get fixed ids (1, 2, ...), exercises reference types, units and
+# goal types by those ids.
+SEED_TABLES = [
+    (Exercise_Type, Exercise_Type.exercise_type_id, exercise_type_data),
+    (Exercise_Unit, Exercise_Unit.unit_id, exercise_unit_types),
+    (Goal_Type, Goal_Type.goal_type_id, goal_types),
+    (Exercise, Exercise.exercise_id, exercises_data),
+]
 
-def populate_database():
-    populate_exercise_type(exercise_type_data)
-    populate_exercise_unit(exercise_unit_types)
-    populate_goal_type(goal_types)
-    populate_exercise(exercises_data)
 
+# One multi row INSERT ... ON CONFLICT DO NOTHING per table, running it
+# again (or from another worker) inserts nothing. Returns inserted counts.
+def populate_database(connection):
+    inserted = {}
+    for model, primary_key, rows in SEED_TABLES:
+        result = connection.execute(
+            insert(model)
+            .values([
+                {primary_key.key: row_id, **row}
+                for row_id, row in enumerate(rows, start=1)
+            ])
+            .on_conflict_do_nothing()
+        )
+        inserted[model.__tablename__] = result.rowcount
 
+        # Explicit ids do not advance the serial sequence
+        max_id = connection.scalar(select(func.max(primary_key)))
+        connection.execute(
+            text("SELECT setval(pg_get_serial_sequence(:table, :column), "
+                 ":value)"),
+            {
+                "table": model.__tablename__,
+                "column": primary_key.key,
+                "value": max_id,
+            },
+        )
+    return inserted
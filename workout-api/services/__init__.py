@@ -0,0 +1,25 @@
+from .goal_payloads import build_goal_payloads
+from .catalog import catalog, reload_catalog, catalog_response
+from .password_hashing import PasswordHasher
+from .login_throttle import LoginThrottle, MemoryCounters, RedisCounters
+from .token_cache import VerifiedTokenCache
+from .identity_cache import IdentityCache
+from .cron import (
+    CronError, parse_cron, schedule_occurrences, naive_utc, merge_occurrences,
+)
+from .workout_sets import write_workout_sets, WORKOUT_SET_COLUMNS
+from .goal_progress import (
+    add_set_progress, add_weight_progress, rebuild_goal_progress,
+    WEIGHT_GOAL_TARGET,
+)
+from .history_analytics import analytics_query, history_analytics
+from .history_writer import HistoryWriter
+from .collection_versions import (
+    bump_collection_versions, GOALS, SCHEDULES,
+)
+from .response_cache import response_cache, collection_response, render_json
+from .metrics import (
+    request_metrics, instrument_engine, MetricsMiddleware, render_prometheus,
+    stats_families,
+)
+from .profiling import ProfilingMiddleware, capture_statements
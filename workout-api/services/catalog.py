@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from starlette import status
+
+from database import AsyncSessionLocal
+from models import Exercise, Exercise_Type, Exercise_Unit, Goal_Type
+
+
+# Exercises, exercise types, exercise units and goal types are seed data,
+# they are loaded once per process and served from memory as
+# pre-serialized json bodies with a content hash used as ETag.
+
+
+class CatalogEntry:
+    def __init__(self, payload):
+        self.body = json.dumps(
+            payload,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+
+
+def columns_dict(row):
+    return {
+        column.key: getattr(row, column.key)
+        for column in row.__mapper__.column_attrs
+    }
+
+
+class ReferenceCatalog:
+    def __init__(self):
+        self.entries = {}
+        self.exercises = {}
+        self.loaded = False
+        self.lock = asyncio.Lock()
+
+    async def load(self, db):
+        exercise_types = (await db.scalars(
+            select(Exercise_Type).order_by(Exercise_Type.exercise_type_id)
+        )).all()
+        exercise_units = (await db.scalars(
+            select(Exercise_Unit).order_by(Exercise_Unit.unit_id)
+        )).all()
+        goal_types = (await db.scalars(
+            select(Goal_Type).order_by(Goal_Type.goal_type_id)
+        )).all()
+        exercises = (await db.scalars(
+            select(Exercise).order_by(Exercise.exercise_id)
+        )).all()
+
+        type_names = {
+            exercise_type.exercise_type_id: exercise_type.exercise_type_name
+            for exercise_type in exercise_types
+        }
+        goal_targets = {
+            goal_type.goal_type_id: goal_type.goal_target
+            for goal_type in goal_types
+        }
+
+        # Same filtering as the inner joins the routes used to run
+        by_type = sorted(
+            (e for e in exercises if e.exercise_type_id in type_names),
+            key=lambda e: (e.exercise_type_id, e.exercise_id),
+        )
+        by_goal_type = sorted(
+            (e for e in exercises if e.goal_type_id in goal_targets),
+            key=lambda e: (e.goal_type_id, e.exercise_id),
+        )
+
+        entries = {}
+        if by_type:
+            entries["exercises_by_type"] = CatalogEntry({
+                "exercises": [
+                    dict(
+                        exercise_id=exercise.exercise_id,
+                        exercise_name=exercise.exercise_name,
+                        description=exercise.description,
+                        instructions=exercise.instructions,
+                        target_muscles=exercise.target_muscles,
+                        difficulty=exercise.difficulty,
+                        exercise_type_id=exercise.exercise_type_id,
+                        unit_type_id=exercise.unit_type_id,
+                        goal_type_id=exercise.goal_type_id,
+                        exercise_type_name=type_names[
+                            exercise.exercise_type_id],
+                    )
+                    for exercise in by_type
+                ]
+            })
+        if by_goal_type:
+            entries["exercises_by_goal_type"] = CatalogEntry({
+                "exercises": [
+                    dict(
+                        goal_target=goal_targets[exercise.goal_type_id],
+                        exercise_id=exercise.exercise_id,
+                        exercise_name=exercise.exercise_name,
+                        description=exercise.description,
+                        instructions=exercise.instructions,
+                        target_muscles=exercise.target_muscles,
+                        difficulty=exercise.difficulty,
+                        goal_type_id=exercise.goal_type_id,
+                    )
+                    for exercise in by_goal_type
+                ]
+            })
+        if exercise_types:
+            entries["exercise_types"] = CatalogEntry(
+                {"exercise_types": [columns_dict(t) for t in exercise_types]}
+            )
+        if exercise_units:
+            entries["exercise_units"] = CatalogEntry(
+                {"exercise_units": [columns_dict(u) for u in exercise_units]}
+            )
+        if goal_types:
+            entries["goal_types"] = CatalogEntry(
+                {"goal_types": [columns_dict(g) for g in goal_types]}
+            )
+
+        # Swapping whole dicts, readers never see a half loaded catalog
+        self.exercises = {
+            exercise.exercise_id: CatalogEntry(
+                {"exercises": columns_dict(exercise)})
+            for exercise in exercises
+        }
+        self.entries = entries
+        self.loaded = True
+        logging.info(
+            f"Reference catalog loaded: {len(exercises)} exercises, "
+            f"{len(exercise_types)} exercise types, "
+            f"{len(exercise_units)} exercise units, "
+            f"{len(goal_types)} goal types"
+        )
+
+    async def reload(self):
+        async with self.lock:
+            async with AsyncSessionLocal() as db:
+                await self.load(db)
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with self.lock:
+                if not self.loaded:
+                    async with AsyncSessionLocal() as db:
+                        await self.load(db)
+
+    async def entry(self, name):
+        await self.ensure_loaded()
+        return self.entries.get(name)
+
+    async def exercise(self, exercise_id):
+        await self.ensure_loaded()
+        return self.exercises.get(exercise_id)
+
+
+catalog = ReferenceCatalog()
+
+
+# Explicit reload hook, to be called after reference data changes
+async def reload_catalog():
+    await catalog.reload()
+
+
+def etag_matches(request: Request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def catalog_response(request: Request, entry: CatalogEntry):
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=headers)
+    return Response(content=entry.body, media_type="application/json",
+                    headers=headers)
@@ -0,0 +1,38 @@
+from sqlalchemy import literal, select
+from sqlalchemy.dialects.postgresql import insert
+
+from models import Collection_Version
+
+
+# Per-user collections served with an ETag. A collection version is bumped
+# in the same transaction as every write that changes its payload, a
+# conditional GET then only reads the version to answer 304
+# (services/response_cache.py).
+GOALS = "goals"
+SCHEDULES = "schedules"
+
+
+# users is a user_id or a select of user ids
+async def bump_collection_versions(db, users, *collections):
+    if isinstance(users, int):
+        users = select(literal(users))
+    users = users.subquery()
+    for collection in collections:
+        statement = insert(Collection_Version).from_select(
+            ["user_id", "collection", "version"],
+            select(users.c[0], literal(collection), literal(1)),
+        )
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[Collection_Version.user_id,
+                            Collection_Version.collection],
+            set_={"version": Collection_Version.version + 1},
+        ))
+
+
+async def collection_version(db, user_id, collection):
+    version = await db.scalar(
+        select(Collection_Version.version)
+        .where(Collection_Version.user_id == user_id,
+               Collection_Version.collection == collection)
+    )
+    return version or 0
@@ -0,0 +1,229 @@
+import bisect
+import heapq
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+
+# Standard 5 field cron (minute hour day-of-month month day-of-week).
+# Supports *, lists, ranges, steps, month/day names and @ macros.
+# Expressions are compiled once into sorted value tuples and cached,
+# expansion walks matching days and yields their times without testing
+# every minute of the window.
+
+MONTH_NAMES = {
+    name: number for number, name in enumerate(
+        ["jan", "feb", "mar", "apr", "may", "jun",
+         "jul", "aug", "sep", "oct", "nov", "dec"], start=1)
+}
+DAY_NAMES = {
+    name: number for number, name in enumerate(
+        ["sun", "mon", "tue", "wed", "thu", "fri", "sat"])
+}
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# Longest month length, february counts its leap day
+MONTH_DAYS = {1: 31, 2: 29, 3: 31, 4: 30, 5: 31, 6: 30,
+              7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31}
+
+# (name, lowest, highest, names)
+FIELDS = [
+    ("minute", 0, 59, None),
+    ("hour", 0, 23, None),
+    ("day of month", 1, 31, None),
+    ("month", 1, 12, MONTH_NAMES),
+    # 7 is accepted as sunday and folded into 0
+    ("day of week", 0, 7, DAY_NAMES),
+]
+
+
+class CronError(ValueError):
+    pass
+
+
+def parse_value(value, field):
+    name, lowest, highest, names = field
+    if names and value.lower() in names:
+        return names[value.lower()]
+    try:
+        number = int(value)
+    except ValueError:
+        raise CronError(f"Invalid {name} value '{value}'")
+    if not lowest <= number <= highest:
+        raise CronError(
+            f"{name} value {number} out of range {lowest}-{highest}")
+    return number
+
+
+def parse_field(text, field):
+    name, lowest, highest, names = field
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"Invalid {name} step '{step_text}'")
+            step = int(step_text)
+
+        if part == "*":
+            first, last = lowest, highest
+        elif "-" in part:
+            first_text, last_text = part.split("-", 1)
+            first = parse_value(first_text, field)
+            last = parse_value(last_text, field)
+            if first > last:
+                raise CronError(f"Invalid {name} range '{part}'")
+        else:
+            first = parse_value(part, field)
+            # "5/15" means every 15 starting at 5
+            last = highest if step > 1 else first
+
+        values.update(range(first, last + 1, step))
+    return values
+
+
+class CronExpression:
+    __slots__ = (
+        "expression", "minutes", "hours", "days", "months", "weekdays",
+        "day_restricted", "weekday_restricted", "times", "possible",
+    )
+
+    def __init__(self, expression):
+        self.expression = expression
+        text = MACROS.get(expression.lower(), expression)
+        parts = text.split()
+        if len(parts) != 5:
+            raise CronError(
+                f"Expected 5 fields in cron expression, got {len(parts)}")
+
+        minutes, hours, days, months, weekdays = (
+            parse_field(part, field) for part, field in zip(parts, FIELDS)
+        )
+        if 7 in weekdays:
+            weekdays.discard(7)
+            weekdays.add(0)
+
+        self.minutes = tuple(sorted(minutes))
+        self.hours = tuple(sorted(hours))
+        self.days = frozenset(days)
+        self.months = frozenset(months)
+        self.weekdays = frozenset(weekdays)
+        # Standard cron: when both day fields are restricted a day
+        # matches if either of them does
+        self.day_restricted = not parts[2].startswith("*")
+        self.weekday_restricted = not parts[4].startswith("*")
+        # Every (hour, minute) of a matching day, in order
+        self.times = [(h, m) for h in self.hours for m in self.minutes]
+        # "0 0 31 2 *" never matches, its days are not walked at all
+        self.possible = not self.day_restricted or \
+            self.weekday_restricted or any(
+                day <= MONTH_DAYS[month]
+                for month in self.months for day in self.days)
+
+    def matches_day(self, day):
+        if day.month not in self.months:
+            return False
+        day_match = day.day in self.days
+        # datetime weekday() is monday=0, cron is sunday=0
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_match or weekday_match
+        if self.day_restricted:
+            return day_match
+        if self.weekday_restricted:
+            return weekday_match
+        return True
+
+    # Lazily yields occurrences in [start, end)
+    def occurrences(self, start, end):
+        if not self.possible:
+            return
+        if start.second or start.microsecond:
+            # No whole minute left before datetime.max
+            if start > datetime.max - timedelta(minutes=1):
+                return
+            start = start.replace(second=0, microsecond=0) + \
+                timedelta(minutes=1)
+        if start >= end:
+            return
+
+        day = start.date()
+        last_day = end.date()
+        one_day = timedelta(days=1)
+        times = self.times
+        while day <= last_day:
+            if day.month not in self.months:
+                # Jump to the 1st of the next month
+                if day.month == 12:
+                    if day.year == date.max.year:
+                        return
+                    day = date(day.year + 1, 1, 1)
+                else:
+                    day = date(day.year, day.month + 1, 1)
+                continue
+            if self.matches_day(day):
+                index = 0
+                if day == start.date():
+                    index = bisect.bisect_left(
+                        times, (start.hour, start.minute))
+                for hour, minute in times[index:]:
+                    when = datetime(day.year, day.month, day.day,
+                                    hour, minute)
+                    if when >= end:
+                        return
+                    yield when
+            # Stops at the last representable day instead of overflowing
+            if day == last_day:
+                return
+            day += one_day
+
+
+# Parsed expressions are immutable, so they are shared between requests
+@lru_cache(maxsize=4096)
+def compile_cron(expression):
+    return CronExpression(expression)
+
+
+def parse_cron(expression):
+    return compile_cron(" ".join(expression.split()))
+
+
+# Aware datetimes are converted to naive utc, like the stored columns
+def naive_utc(value):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Occurrences of a schedule inside [window_start, window_end),
+# clipped to its start_date and end_date (inclusive)
+def schedule_occurrences(crontab_value, start_date, end_date,
+                         window_start, window_end):
+    start = naive_utc(window_start)
+    end = naive_utc(window_end)
+    if start_date is not None and start_date > start:
+        start = start_date
+    if end_date is not None and end_date < end:
+        end = end_date + timedelta(microseconds=1)
+    return parse_cron(crontab_value).occurrences(start, end)
+
+
+def tagged(key, occurrences):
+    for when in occurrences:
+        yield when, key
+
+
+# Merges per schedule occurrence streams into one (when, key) stream
+# ordered by time then key. Only the head of every stream is kept in
+# the heap, so taking the first n items expands n + len(streams) values.
+def merge_occurrences(streams):
+    return heapq.merge(*(tagged(key, occurrences)
+                         for key, occurrences in streams))
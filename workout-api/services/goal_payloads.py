@@ -0,0 +1,85 @@
+from sqlalchemy import select
+
+from models import Exercise, Exercise_Unit
+from .goal_progress import progress_summary
+
+
+# Builds /goal/personal_goals/ payloads for a list of goals.
+# Goal types and progress are expected to be loaded together with the goals,
+# exercises and units are fetched once for all goals (2 queries total),
+# instead of once per goal and once per exercise.
+async def build_goal_payloads(db, goals):
+    exercise_ids = set()
+    for goal in goals:
+        exercise_ids.update(goal.selected_exercises or [])
+
+    exercises = {}
+    if exercise_ids:
+        exercises = {
+            exercise.exercise_id: exercise
+            for exercise in await db.scalars(
+                select(Exercise).where(Exercise.exercise_id.in_(exercise_ids))
+            )
+        }
+
+    unit_ids = {
+        exercise.unit_type_id for exercise in exercises.values()
+        if exercise.unit_type_id is not None
+    }
+    units = {}
+    if unit_ids:
+        units = {
+            unit.unit_id: unit
+            for unit in await db.scalars(
+                select(Exercise_Unit)
+                .where(Exercise_Unit.unit_id.in_(unit_ids))
+            )
+        }
+
+    return [
+        goal_payload(goal, exercises, units) for goal in goals
+    ]
+
+
+def goal_payload(goal, exercises, units):
+    selected_exercises_dict = []
+    # Exercises are listed in selection order, duplicates dropped
+    for exercise_id in dict.fromkeys(goal.selected_exercises or []):
+        exercise = exercises.get(exercise_id)
+        if exercise is None:
+            continue
+        selected_exercises_dict.append(
+            exercise_payload(exercise, units.get(exercise.unit_type_id))
+        )
+
+    return dict(
+        goal_id=goal.goal_id,
+        goal_name=goal.goal_name,
+        user_id=goal.user_id,
+        created_time=goal.created_time,
+        start_date=goal.start_date,
+        end_date=goal.end_date,
+        range_min=goal.range_min,
+        range_max=goal.range_max,
+        selected_exercises=selected_exercises_dict,
+        completed=goal.completed,
+        goal_type_id=goal.goal_type_id,
+        goal_target=goal.goal_type.goal_target,
+        **progress_summary(goal, goal.progress),
+    )
+
+
+def exercise_payload(exercise, exercise_unit):
+    return dict(
+        exercise_id=exercise.exercise_id,
+        exercise_name=exercise.exercise_name,
+        description=exercise.description,
+        instructions=exercise.instructions,
+        target_muscles=exercise.target_muscles,
+        difficulty=exercise.difficulty,
+        exercise_type_id=exercise.exercise_type_id,
+        unit_type_id=exercise.unit_type_id,
+        unit_1=exercise_unit.unit_1 if exercise_unit else None,
+        unit_2=exercise_unit.unit_2 if exercise_unit else None,
+        goal_type_id=exercise.goal_type_id,
+    )
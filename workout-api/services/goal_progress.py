@@ -0,0 +1,267 @@
+from datetime import datetime
+
+from sqlalchemy import and_, case, delete, func, literal, or_, select, true
+from sqlalchemy.dialects.postgresql import array, insert
+
+from models import Goal, Goal_Progress, Goal_Type, User_History, Workout_Set
+
+
+# Goal progress is read from one Goal_Progress row per goal. The rows are
+# updated incrementally when sets or weight history arrive and rebuilt
+# from the raw rows when a goal changes or for backfills.
+#
+# Weight goals follow the weight_change history towards range_min-
+# range_max. Other goals add up value_1 of the sets done for their
+# selected exercises (sets, km, ...) between start_date and end_date,
+# the goal is reached at range_min (or range_max when it has no minimum).
+
+WEIGHT_GOAL_TARGET = "Weight"
+
+
+def in_goal_dates(column):
+    return and_(
+        or_(Goal.start_date.is_(None), column >= Goal.start_date),
+        or_(Goal.end_date.is_(None), column <= Goal.end_date),
+    )
+
+
+def upsert_progress(statement, **updates):
+    return statement.on_conflict_do_update(
+        index_elements=[Goal_Progress.goal_id],
+        set_=dict(updates, updated=statement.excluded.updated),
+    )
+
+
+# rows are workout set tuples in WORKOUT_SET_COLUMNS order, returns the
+# number of goals updated
+async def add_set_progress(db, user_id, rows):
+    exercise_ids = sorted({row[1] for row in rows})
+    goals = (await db.execute(
+        select(Goal.goal_id, Goal.selected_exercises,
+               Goal.start_date, Goal.end_date)
+        .where(Goal.user_id == user_id,
+               Goal.selected_exercises.op("&&")(array(exercise_ids)))
+    )).all()
+
+    now = datetime.utcnow()
+    deltas = []
+    for goal_id, selected_exercises, start_date, end_date in goals:
+        selected_exercises = set(selected_exercises)
+        set_count = 0
+        total_value = 0.0
+        times = []
+        for _, exercise_id, _, performed_at, value_1, *_ in rows:
+            if exercise_id not in selected_exercises:
+                continue
+            if start_date is not None and performed_at < start_date:
+                continue
+            if end_date is not None and performed_at > end_date:
+                continue
+            set_count += 1
+            total_value += value_1 or 0
+            times.append(performed_at)
+        if set_count:
+            deltas.append(dict(
+                goal_id=goal_id,
+                set_count=set_count,
+                total_value=total_value,
+                first_activity=min(times),
+                last_activity=max(times),
+                updated=now,
+            ))
+    if not deltas:
+        return 0
+
+    # One multi-row upsert, concurrent batches add up under the row lock
+    statement = insert(Goal_Progress).values(deltas)
+    excluded = statement.excluded
+    await db.execute(upsert_progress(
+        statement,
+        set_count=Goal_Progress.set_count + excluded.set_count,
+        total_value=Goal_Progress.total_value + excluded.total_value,
+        first_activity=func.least(
+            Goal_Progress.first_activity, excluded.first_activity),
+        last_activity=func.greatest(
+            Goal_Progress.last_activity, excluded.last_activity),
+    ))
+    return len(deltas)
+
+
+# Last weight recorded before the goal started, the starting point of
+# weight goals. The first weight inside the goal dates is used without one.
+def weight_before_goal():
+    return (
+        select(User_History.weight_change)
+        .where(User_History.user_id == Goal.user_id,
+               User_History.weight_change.is_not(None),
+               User_History.created < Goal.start_date)
+        .order_by(User_History.created.desc(),
+                  User_History.history_id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+# Returns the number of weight goals updated
+async def add_weight_progress(db, user_id, weight, recorded):
+    goals = (
+        select(
+            Goal.goal_id,
+            literal(0),
+            literal(0.0),
+            func.coalesce(weight_before_goal(), weight),
+            literal(weight),
+            literal(recorded),
+            literal(recorded),
+        )
+        .join(Goal_Type, Goal.goal_type_id == Goal_Type.goal_type_id)
+        .where(Goal.user_id == user_id,
+               Goal_Type.goal_target == WEIGHT_GOAL_TARGET,
+               in_goal_dates(literal(recorded)))
+    )
+    statement = insert(Goal_Progress).from_select(
+        ["goal_id", "set_count", "total_value", "start_weight",
+         "current_weight", "weight_updated", "updated"],
+        goals,
+    )
+    excluded = statement.excluded
+    result = await db.execute(upsert_progress(
+        statement,
+        start_weight=func.coalesce(
+            Goal_Progress.start_weight, excluded.start_weight),
+        current_weight=excluded.current_weight,
+        weight_updated=excluded.weight_updated,
+    ))
+    return result.rowcount
+
+
+# Recomputes progress of the goals matching criteria (Goal or Goal_Type
+# clauses, every goal without any) from workout_sets and user_history
+async def rebuild_goal_progress(db, *criteria):
+    goal_ids = (
+        select(Goal.goal_id)
+        .outerjoin(Goal_Type, Goal.goal_type_id == Goal_Type.goal_type_id)
+        .where(*criteria)
+    )
+    await db.execute(
+        delete(Goal_Progress).where(Goal_Progress.goal_id.in_(goal_ids)))
+
+    sets = (
+        select(
+            func.count().label("set_count"),
+            func.coalesce(func.sum(Workout_Set.value_1), 0.0)
+            .label("total_value"),
+            func.min(Workout_Set.performed_at).label("first_activity"),
+            func.max(Workout_Set.performed_at).label("last_activity"),
+        )
+        .where(Workout_Set.user_id == Goal.user_id,
+               Workout_Set.exercise_id == func.any(Goal.selected_exercises),
+               in_goal_dates(Workout_Set.performed_at))
+        .lateral("sets")
+    )
+
+    def weight_in_goal(column, descending):
+        created, history_id = User_History.created, User_History.history_id
+        if descending:
+            created, history_id = created.desc(), history_id.desc()
+        return (
+            select(column)
+            .where(User_History.user_id == Goal.user_id,
+                   User_History.weight_change.is_not(None),
+                   in_goal_dates(User_History.created))
+            .order_by(created, history_id)
+            .limit(1)
+            .scalar_subquery()
+        )
+
+    first_weight = weight_in_goal(User_History.weight_change, False)
+    last_weight = weight_in_goal(User_History.weight_change, True)
+    last_weight_time = weight_in_goal(User_History.created, True)
+    is_weight_goal = Goal_Type.goal_target == WEIGHT_GOAL_TARGET
+
+    goals = (
+        select(
+            Goal.goal_id,
+            sets.c.set_count,
+            sets.c.total_value,
+            sets.c.first_activity,
+            sets.c.last_activity,
+            case((and_(is_weight_goal, last_weight.is_not(None)),
+                  func.coalesce(weight_before_goal(), first_weight))),
+            case((is_weight_goal, last_weight)),
+            case((is_weight_goal, last_weight_time)),
+            literal(datetime.utcnow()),
+        )
+        .outerjoin(Goal_Type, Goal.goal_type_id == Goal_Type.goal_type_id)
+        .join(sets, true())
+        .where(*criteria)
+    )
+    result = await db.execute(insert(Goal_Progress).from_select(
+        ["goal_id", "set_count", "total_value", "first_activity",
+         "last_activity", "start_weight", "current_weight",
+         "weight_updated", "updated"],
+        goals,
+    ))
+    return result.rowcount
+
+
+# Progress fields of the /goal/personal_goals/ payload, computed from the
+# aggregates only
+def progress_summary(goal, progress):
+    if goal.goal_type is not None and \
+            goal.goal_type.goal_target == WEIGHT_GOAL_TARGET:
+        return weight_progress(goal, progress)
+    return activity_progress(goal, progress)
+
+
+def summary(value, percent, projected):
+    return dict(
+        progress_value=value,
+        progress_percent=None if percent is None else round(percent, 1),
+        projected_completion=projected,
+    )
+
+
+def activity_progress(goal, progress):
+    value = progress.total_value if progress is not None else 0.0
+    target = goal.range_min if goal.range_min else goal.range_max
+    if not target or target <= 0:
+        return summary(value, None, None)
+    percent = min(100.0, max(0.0, value / target * 100))
+
+    # Linear projection at the average rate since the goal started
+    projected = None
+    if 0 < value < target and progress.last_activity is not None:
+        since = goal.start_date or progress.first_activity
+        elapsed = progress.last_activity - since
+        if elapsed.total_seconds() > 0:
+            projected = progress.last_activity + \
+                elapsed * ((target - value) / value)
+    return summary(value, percent, projected)
+
+
+def weight_progress(goal, progress):
+    if progress is None or progress.current_weight is None:
+        return summary(None, None, None)
+    start = progress.start_weight
+    current = progress.current_weight
+    low, high = goal.range_min, goal.range_max
+    if (low is None or current >= low) and (high is None or current <= high):
+        return summary(current, 100.0, None)
+
+    bound = high if high is not None and current > high else low
+    percent = 0.0
+    if start != bound:
+        percent = min(100.0, max(0.0, (start - current) / (start - bound)
+                                 * 100))
+
+    # Projected while the weight moves towards the range
+    projected = None
+    change = current - start
+    since = goal.start_date or goal.created_time
+    if change and since is not None and (bound - current) / change > 0:
+        elapsed = progress.weight_updated - since
+        if elapsed.total_seconds() > 0:
+            projected = progress.weight_updated + \
+                elapsed * ((bound - current) / change)
+    return summary(current, percent, projected)
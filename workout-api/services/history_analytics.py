@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+from sqlalchemy import func, select
+
+from models import User_History
+
+
+# Downsampled User_History series for charts. Buckets are aggregated in
+# SQL, trend statistics run vectorized over the bucket arrays.
+
+METRICS = {
+    "weight": User_History.weight_change,
+    "height": User_History.height_change,
+    "bmi": User_History.bmi_calculation,
+}
+
+
+def analytics_query(user_id, bucket, window_start, window_end):
+    period = func.date_trunc(bucket, User_History.created).label("bucket")
+    columns = [period]
+    for name, column in METRICS.items():
+        average = func.avg(column)
+        columns += [
+            average.label(f"{name}_avg"),
+            func.min(column).label(f"{name}_min"),
+            func.max(column).label(f"{name}_max"),
+            func.count(column).label(f"{name}_count"),
+            # Change against the previous bucket holding a value
+            (average - func.lag(average).over(
+                partition_by=func.count(column) > 0, order_by=period,
+            )).label(f"{name}_change"),
+        ]
+    return (
+        select(*columns)
+        .where(User_History.user_id == user_id,
+               User_History.created >= window_start,
+               User_History.created < window_end)
+        .group_by(period)
+        .order_by(period)
+    )
+
+
+# Trailing moving average over the last `window` buckets, buckets without
+# a value (NaN) are left out of the mean instead of counted as zero
+def moving_average(values, window):
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    count = counts[end] - counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, (sums[end] - sums[start]) / count, np.nan)
+
+
+# Least squares slope of the bucket averages, in units per day
+def slope_per_day(days, values):
+    valid = ~np.isnan(values)
+    if np.count_nonzero(valid) < 2 or np.ptp(days[valid]) == 0:
+        return None
+    return float(np.polyfit(days[valid], values[valid], 1)[0])
+
+
+def json_list(values, digits=3):
+    return [
+        None if value is None or math.isnan(value) else round(value, digits)
+        for value in values
+    ]
+
+
+def history_analytics(rows, window):
+    buckets = [row.bucket for row in rows]
+    days = np.array([
+        (bucket - buckets[0]).total_seconds() / 86400 for bucket in buckets
+    ], dtype=float)
+    if not rows:
+        days = np.empty(0)
+
+    series = {}
+    for name in METRICS:
+        averages = np.array([
+            getattr(row, f"{name}_avg") for row in rows
+        ], dtype=float)
+        slope = slope_per_day(days, averages)
+        series[name] = {
+            "avg": json_list(averages),
+            "min": [getattr(row, f"{name}_min") for row in rows],
+            "max": [getattr(row, f"{name}_max") for row in rows],
+            "count": [getattr(row, f"{name}_count") for row in rows],
+            "change": json_list([
+                None if getattr(row, f"{name}_change") is None
+                else float(getattr(row, f"{name}_change"))
+                for row in rows
+            ]),
+            "moving_average": json_list(moving_average(averages, window)),
+            "slope_per_day": None if slope is None else round(slope, 5),
+        }
+    return {"buckets": buckets, "series": series}
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import insert
+
+from database import AsyncSessionLocal
+from models import User_History
+from .collection_versions import bump_collection_versions, GOALS
+from .goal_progress import add_weight_progress
+
+
+# Write-behind buffer for User_History rows. Requests only append to the
+# buffer, a background task inserts the rows in one batch once `size` rows
+# are waiting or `interval` seconds passed. Rows are visible in /history/
+# after the flush and rows still buffered are lost if the process dies,
+# the buffer is flushed on shutdown.
+class HistoryWriter:
+    def __init__(self, size, interval):
+        self.size = size
+        self.interval = interval
+        self.rows = []
+        self.full = asyncio.Event()
+        self.task = None
+        self.stopping = False
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        self.last_flush_seconds = 0.0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.size:
+            self.full.set()
+
+    def start(self):
+        if self.task is None:
+            self.stopping = False
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self.full.clear()
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(User_History.__table__), rows)
+                # Weight goal progress, in the order the weights arrived
+                changed_users = set()
+                for row in rows:
+                    if row["weight_change"] is not None and \
+                            await add_weight_progress(
+                                db, row["user_id"], row["weight_change"],
+                                row["created"]):
+                        changed_users.add(row["user_id"])
+                for user_id in sorted(changed_users):
+                    await bump_collection_versions(db, user_id, GOALS)
+                await db.commit()
+        except asyncio.CancelledError:
+            # Not written, the rows go back for the next flush
+            self.rows = rows + self.rows
+            raise
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"History write-behind flush failed: {e}")
+            # Kept for the next flush, up to a few batches
+            self.rows = (rows + self.rows)[-self.size * 10:]
+            return
+        self.flushes += 1
+        self.written += len(rows)
+        self.last_flush_seconds = time.perf_counter() - started
+
+    # A flush in progress is awaited, never cancelled, then whatever was
+    # added in the meantime is flushed too
+    async def close(self):
+        if self.task is not None:
+            self.stopping = True
+            self.full.set()
+            await self.task
+            self.task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "interval": self.interval,
+            "buffered": len(self.rows),
+            "flushes": self.flushes,
+            "written": self.written,
+            "failures": self.failures,
+            "last_flush_seconds": round(self.last_flush_seconds, 4),
+        }
@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+
+
+# Short lived cache of row column values keyed by primary key.
+# Holds plain dicts, never ORM instances, so no object is shared between
+# sessions; callers rebuild and attach an instance per request.
+class IdentityCache:
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if self.ttl <= 0:
+            return None
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, values):
+        if self.ttl <= 0:
+            return
+        self.entries[key] = (values, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,134 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from starlette import status
+
+
+# Sliding window counters of login attempts. Each key counts attempts in
+# fixed windows, the estimate for the last `window` seconds weighs the
+# previous window by how much of it still overlaps:
+#   previous * (1 - elapsed / window) + current
+# Every attempt is counted, including rejected ones, so a client that
+# keeps hammering stays rejected.
+
+
+# Per worker counters, the least recently used keys are dropped first
+class MemoryCounters:
+    name = "memory"
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.entries = OrderedDict()
+
+    async def hit(self, keys, index, window):
+        counts = []
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [index, 0, 0]
+            elif entry[0] != index:
+                previous = entry[2] if entry[0] == index - 1 else 0
+                entry[:] = [index, previous, 0]
+            entry[2] += 1
+            self.entries.move_to_end(key)
+            counts.append((entry[1], entry[2]))
+        while len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+        return counts
+
+    async def close(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"keys": len(self.entries)}
+
+
+# Counters shared by the workers in a Redis protocol server, one round
+# trip per attempt
+class RedisCounters:
+    name = "redis"
+    prefix = "workout-api:login:"
+
+    def __init__(self, url):
+        # Only needed when shared counters are configured
+        import redis.asyncio
+
+        self.client = redis.asyncio.from_url(url)
+
+    async def hit(self, keys, index, window):
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys:
+            current = f"{self.prefix}{key}:{index}"
+            pipeline.incr(current)
+            pipeline.expire(current, window * 2)
+            pipeline.get(f"{self.prefix}{key}:{index - 1}")
+        replies = await pipeline.execute()
+        return [
+            (int(replies[i + 2] or 0), int(replies[i]))
+            for i in range(0, len(replies), 3)
+        ]
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self):
+        return {}
+
+
+class LoginThrottle:
+    # limits maps a key kind ("username", "ip") to the attempts allowed
+    # per window, kinds with a limit of 0 are not counted
+    def __init__(self, counters, window, limits):
+        self.counters = counters
+        self.window = window
+        self.limits = {kind: limit for kind, limit in limits.items()
+                       if limit > 0}
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    # Raises 429 when any key is over its limit, before the caller runs
+    # the password hash. Counter failures let the attempt through.
+    async def check(self, **values):
+        if not self.limits:
+            return
+        now = time.time()
+        index = int(now // self.window)
+        kinds = [kind for kind in self.limits if values.get(kind)]
+        try:
+            counts = await self.counters.hit(
+                [f"{kind}:{values[kind]}" for kind in kinds],
+                index, self.window)
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Login throttle counters failed: {e}")
+            return
+
+        overlap = 1 - (now % self.window) / self.window
+        for kind, (previous, current) in zip(kinds, counts):
+            if previous * overlap + current > self.limits[kind]:
+                self.rejected += 1
+                retry_after = math.ceil(self.window - now % self.window)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many login attempts, try again later.",
+                    headers={"Retry-After": str(retry_after)},
+                )
+        self.allowed += 1
+
+    async def close(self):
+        await self.counters.close()
+
+    def stats(self):
+        return {
+            "counters": self.counters.name,
+            "window": self.window,
+            "limits": self.limits,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            **self.counters.stats(),
+        }
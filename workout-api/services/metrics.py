@@ -0,0 +1,234 @@
+import bisect
+import logging
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from config import QUERY_BUDGET
+
+
+# Request and SQL metrics of this worker, served in the Prometheus text
+# format on /metrics. Requests are labelled with their route template
+# (scope["route"].path), never the raw path, so ids do not add series.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One extra slot for +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", dict(labels, le=str(bound)), cumulative
+        yield f"{name}_sum", labels, round(self.sum, 6)
+        yield f"{name}_count", labels, self.count
+
+
+# Work done for one request, shared by the engine hooks through a
+# contextvar. The context is carried into SQLAlchemy's greenlets.
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request = ContextVar("current_request", default=None)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.over_budget = 0
+        self.statuses = {}
+
+
+class RequestMetrics:
+    def __init__(self, query_budget):
+        self.query_budget = query_budget
+        self.routes = {}
+        self.in_flight = 0
+        # Queries outside of requests (startup, background flushes)
+        self.other_queries = 0
+        self.other_db_seconds = 0.0
+
+    def observe(self, method, route, status_code, seconds, stats):
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+        metrics.latency.observe(seconds)
+        metrics.queries.observe(stats.queries)
+        metrics.db_seconds += stats.db_seconds
+        metrics.statuses[status_code] = \
+            metrics.statuses.get(status_code, 0) + 1
+        if self.query_budget and stats.queries > self.query_budget:
+            metrics.over_budget += 1
+            logging.warning(
+                f"{method} {route} ran {stats.queries} queries "
+                f"({stats.db_seconds * 1000:.1f}ms in the database), "
+                f"over the budget of {self.query_budget}")
+
+    def query_done(self, seconds):
+        stats = current_request.get()
+        if stats is None:
+            self.other_queries += 1
+            self.other_db_seconds += seconds
+        else:
+            stats.queries += 1
+            stats.db_seconds += seconds
+
+    def families(self):
+        requests, latency, queries, db_seconds, over_budget = \
+            [], [], [], [], []
+        for (method, route), metrics in sorted(self.routes.items()):
+            labels = {"method": method, "route": route}
+            for status_code, count in sorted(metrics.statuses.items()):
+                requests.append(("workout_api_requests_total",
+                                 dict(labels, status=str(status_code)),
+                                 count))
+            latency.extend(metrics.latency.samples(
+                "workout_api_request_duration_seconds", labels))
+            queries.extend(metrics.queries.samples(
+                "workout_api_request_db_queries", labels))
+            db_seconds.append(("workout_api_request_db_seconds_total",
+                               labels, round(metrics.db_seconds, 6)))
+            over_budget.append(("workout_api_requests_over_query_budget_total",
+                                labels, metrics.over_budget))
+        return [
+            ("workout_api_requests_total", "counter",
+             "Requests by route and status", requests),
+            ("workout_api_request_duration_seconds", "histogram",
+             "Request latency by route", latency),
+            ("workout_api_request_db_queries", "histogram",
+             "SQL statements per request by route", queries),
+            ("workout_api_request_db_seconds_total", "counter",
+             "Time spent in SQL statements by route", db_seconds),
+            ("workout_api_requests_over_query_budget_total", "counter",
+             "Requests that ran more SQL statements than QUERY_BUDGET",
+             over_budget),
+            ("workout_api_requests_in_flight", "gauge",
+             "Requests being served", [
+                 ("workout_api_requests_in_flight", {}, self.in_flight)]),
+            ("workout_api_background_db_queries_total", "counter",
+             "SQL statements run outside of requests", [
+                 ("workout_api_background_db_queries_total", {},
+                  self.other_queries)]),
+            ("workout_api_background_db_seconds_total", "counter",
+             "Time spent in SQL statements outside of requests", [
+                 ("workout_api_background_db_seconds_total", {},
+                  round(self.other_db_seconds, 6))]),
+        ]
+
+
+request_metrics = RequestMetrics(QUERY_BUDGET)
+
+
+# Times every statement run through the engine (an AsyncEngine's
+# sync_engine or a plain Engine)
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters,
+                             context, executemany):
+        started = conn.info["query_started"].pop()
+        request_metrics.query_done(time.perf_counter() - started)
+
+    # Failed statements are counted too
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        connection = context.connection
+        if connection is not None and connection.info.get("query_started"):
+            started = connection.info["query_started"].pop()
+            request_metrics.query_done(time.perf_counter() - started)
+
+
+# Pure ASGI middleware, streamed bodies are timed until the last chunk
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        request_metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_metrics.in_flight -= 1
+            current_request.reset(token)
+            route = scope.get("route")
+            request_metrics.observe(
+                scope["method"],
+                route.path if route is not None else UNMATCHED_ROUTE,
+                status_code, elapsed, stats)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+# families are (name, type, help, samples), samples (name, labels, value)
+def render_prometheus(families):
+    lines = []
+    for name, kind, description, samples in families:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample, labels, value in samples:
+            if labels:
+                label_text = ",".join(
+                    f'{key}="{escape(label)}"'
+                    for key, label in labels.items())
+                lines.append(f"{sample}{{{label_text}}} {value}")
+            else:
+                lines.append(f"{sample} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Numeric values of a component's stats() as one untyped family each
+def stats_families(component, stats):
+    families = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"workout_api_{component}_{key}"
+        families.append((name, "untyped", f"{component} {key}",
+                         [(name, {}, value)]))
+    return families
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from starlette import status
+
+
+# Runs passlib hashing/verification on a dedicated thread pool,
+# bcrypt releases the GIL so the event loop keeps serving other requests.
+# At most `workers` hashes run at once and at most `max_queue` more may
+# wait for a worker, anything above that is rejected with 503.
+class PasswordHasher:
+    def __init__(self, context, workers, max_queue):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        # Only touched from the event loop, no lock needed
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            logging.warning(
+                f"Password hashing saturated, {self.in_flight} in flight")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later.",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password):
+        return await self.run(self.context.hash, password)
+
+    async def verify(self, password, hashed_password):
+        return await self.run(self.context.verify, password, hashed_password)
+
+    # Same cost as a verify, for logins of unknown users
+    async def dummy_verify(self):
+        return await self.run(self.context.dummy_verify)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
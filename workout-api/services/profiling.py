@@ -0,0 +1,127 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+from config import INTERNAL_API_TOKEN
+
+
+# On-demand profiling of single requests, only installed when
+# PROFILING_ENABLED is set. A request is profiled when it sends
+# "X-Profile: 1" with the internal token, or when it is picked by the
+# sample rate. For each one the directory gets, named
+# <id>-<method>-<route>:
+#   .prof  cProfile dump, open with pstats or snakeviz
+#   .txt   the 40 most expensive functions by cumulative time
+#   .sql   every statement run for the request with its duration
+# The id is sent back in the X-Profile-Id header.
+#
+# cProfile sees every coroutine run on the event loop while the request is
+# in flight, so only one request per worker is profiled at a time.
+
+profiled_statements = ContextVar("profiled_statements", default=None)
+
+
+def capture_statements(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        statements = profiled_statements.get()
+        if statements is not None:
+            conn.info["profile_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters,
+                             context, executemany):
+        statements = profiled_statements.get()
+        if statements is not None:
+            started = conn.info.pop("profile_started", time.perf_counter())
+            statements.append((time.perf_counter() - started, statement,
+                               executemany))
+
+
+def route_name(scope):
+    route = scope.get("route")
+    path = route.path if route is not None else scope["path"]
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+
+
+def write_profile(directory, name, profile, statements):
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, name)
+    profile.dump_stats(base + ".prof")
+
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats(
+        "cumulative").print_stats(40)
+    with open(base + ".txt", "w") as file:
+        file.write(summary.getvalue())
+
+    with open(base + ".sql", "w") as file:
+        total = sum(seconds for seconds, _, _ in statements)
+        file.write(f"-- {len(statements)} statements, "
+                   f"{total * 1000:.2f}ms\n\n")
+        for seconds, statement, executemany in statements:
+            many = " executemany" if executemany else ""
+            file.write(f"-- {seconds * 1000:.2f}ms{many}\n{statement};\n\n")
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, directory, sample_rate):
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.active = False
+
+    def requested(self, scope):
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") == b"1" and INTERNAL_API_TOKEN:
+            token = headers.get(b"x-internal-token", b"")
+            if secrets.compare_digest(token, INTERNAL_API_TOKEN.encode()):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.requested(scope):
+            await self.app(scope, receive, send)
+            return
+        if self.active:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = (f"{datetime.utcnow():%Y%m%dT%H%M%S}-"
+                      f"{uuid.uuid4().hex[:8]}")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        statements = []
+        token = profiled_statements.set(statements)
+        profile = cProfile.Profile()
+        self.active = True
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.disable()
+            self.active = False
+            profiled_statements.reset(token)
+            name = f"{profile_id}-{scope['method']}-{route_name(scope)}"
+            await run_in_threadpool(
+                write_profile, self.directory, name, profile, statements)
+            logging.info(f"Request profile written to "
+                         f"{os.path.join(self.directory, name)}.*")
@@ -0,0 +1,226 @@
+import logging
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from starlette import status
+
+from config import (
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_URL,
+)
+from .catalog import etag_matches
+from .collection_versions import collection_version
+
+
+# Rendered bodies of the per-user collection endpoints, keyed by
+# collection and user_id and tagged with the collection version they were
+# built at. A body is only served while its version is the current one,
+# so a worker that missed an invalidation still never serves stale data.
+# Writes also drop the entries they make stale to free them right away.
+
+
+# In-process LRU, the default backend, bounded both by entry count and
+# by the total size of the stored bodies. A body larger than max_bytes
+# on its own is not kept at all.
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, max_size, max_bytes):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    async def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value):
+        self.discard(key)
+        if len(value) > self.max_bytes:
+            self.oversized += 1
+            return
+        self.entries[key] = value
+        self.bytes += len(value)
+        while (len(self.entries) > self.max_size
+               or self.bytes > self.max_bytes):
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def discard(self, key):
+        value = self.entries.pop(key, None)
+        if value is not None:
+            self.bytes -= len(value)
+
+    async def delete(self, keys):
+        for key in keys:
+            self.discard(key)
+
+    async def close(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            "size": len(self.entries),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+        }
+
+
+# Shared between workers through any server speaking the Redis protocol,
+# entries expire after ttl seconds
+class RedisBackend:
+    name = "redis"
+    prefix = "workout-api:response:"
+
+    def __init__(self, url, ttl):
+        # Only needed when a shared cache is configured
+        import redis.asyncio
+
+        self.client = redis.asyncio.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key):
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key, value):
+        await self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    async def delete(self, keys):
+        await self.client.delete(*[self.prefix + key for key in keys])
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self):
+        return {"ttl": self.ttl}
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.lookup_seconds = 0.0
+        self.build_seconds = 0.0
+
+    @staticmethod
+    def key(collection, user_id):
+        return f"{collection}:{user_id}"
+
+    # A backend failure is a miss, the request is served from the database
+    async def get(self, collection, user_id, version):
+        if self.backend is None:
+            return None
+        started = time.perf_counter()
+        try:
+            value = await self.backend.get(self.key(collection, user_id))
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache get failed: {e}")
+            value = None
+        self.lookup_seconds += time.perf_counter() - started
+        if value is not None:
+            cached_version, body = value.split(b"\n", 1)
+            if int(cached_version) == version:
+                self.hits += 1
+                return body
+        self.misses += 1
+        return None
+
+    async def put(self, collection, user_id, version, body):
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(self.key(collection, user_id),
+                                   b"%d\n" % version + body)
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache set failed: {e}")
+
+    # Called after the commit of writes that changed the collections
+    async def invalidate(self, user_id, *collections):
+        if self.backend is None or not collections:
+            return
+        try:
+            await self.backend.delete(
+                [self.key(collection, user_id) for collection in collections])
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache delete failed: {e}")
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "lookup_seconds": round(self.lookup_seconds, 6),
+            "build_seconds": round(self.build_seconds, 6),
+            "avg_lookup_ms": round(
+                self.lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "avg_build_ms": round(
+                self.build_seconds / self.misses * 1000, 3)
+            if self.misses else 0.0,
+            **(self.backend.stats() if self.backend else {}),
+        }
+
+
+def build_response_cache():
+    if RESPONSE_CACHE_URL:
+        return ResponseCache(RedisBackend(
+            RESPONSE_CACHE_URL, RESPONSE_CACHE_TTL))
+    if RESPONSE_CACHE_SIZE > 0:
+        return ResponseCache(MemoryBackend(
+            RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES))
+    return ResponseCache(None)
+
+
+response_cache = build_response_cache()
+
+
+# Serves a per-user collection: 304 when the client has the current
+# version, the cached body when there is one for it, otherwise the body
+# from build(), an async callable returning the rendered json. The
+# version is read first, a write in between can only make the body newer
+# than its version and that version is already outdated when it commits.
+async def collection_response(request: Request, db, user_id, collection,
+                              build):
+    version = await collection_version(db, user_id, collection)
+    etag = f'"{collection}-{user_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=headers)
+
+    body = await response_cache.get(collection, user_id, version)
+    if body is None:
+        started = time.perf_counter()
+        body = await build()
+        response_cache.build_seconds += time.perf_counter() - started
+        await response_cache.put(collection, user_id, version, body)
+    return Response(content=body, media_type="application/json",
+                    headers=headers)
+
+
+# Rendered the way FastAPI renders the route's response_model
+def render_json(model, payload):
+    return model.model_validate(payload).model_dump_json(
+        by_alias=True).encode("utf-8")
@@ -0,0 +1,60 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+# LRU of already verified JWT claims, keyed by the token digest.
+# Entries are dropped at the token's own exp, so a cached token is never
+# accepted longer than jwt.decode would accept it.
+class VerifiedTokenCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token):
+        if self.max_size <= 0:
+            return None
+        key = self.digest(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires = entry
+        if expires <= time.time():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token, claims, expires):
+        if self.max_size <= 0 or expires <= time.time():
+            return
+        key = self.digest(token)
+        self.entries[key] = (claims, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,45 @@
+from sqlalchemy import insert
+
+from config import WORKOUT_SET_COPY_MIN
+from models import Workout_Set
+
+
+# Column order of the row tuples given to write_workout_sets
+WORKOUT_SET_COLUMNS = (
+    "user_id", "exercise_id", "schedule_id", "performed_at",
+    "value_1", "value_2", "weight",
+)
+
+
+# One prepared INSERT, the rows are sent with asyncpg's pipelined
+# executemany. Measured faster than a single multi-row VALUES statement,
+# which has to be compiled again for every batch size.
+async def insert_workout_sets(db, rows):
+    await db.execute(
+        insert(Workout_Set.__table__),
+        [dict(zip(WORKOUT_SET_COLUMNS, row)) for row in rows],
+    )
+
+
+# Binary COPY through the asyncpg connection of the session
+async def copy_workout_sets(db, rows):
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    # SQLAlchemy opens the transaction lazily on the first statement and
+    # COPY does not go through it, start it so COPY is part of the commit
+    if not driver_connection.is_in_transaction():
+        await connection.exec_driver_sql("SELECT 1")
+    await driver_connection.copy_records_to_table(
+        Workout_Set.__tablename__,
+        records=rows,
+        columns=WORKOUT_SET_COLUMNS,
+    )
+
+
+# Small batches are cheaper as one INSERT, large ones stream with COPY
+async def write_workout_sets(db, rows):
+    if len(rows) >= WORKOUT_SET_COPY_MIN:
+        await copy_workout_sets(db, rows)
+    else:
+        await insert_workout_sets(db, rows)
@@ -0,0 +1,81 @@
+# Tests run against the Postgres at DATABASE_URL, which the app bootstraps
+# on startup like any deployment. Use a scratch database. From the
+# workout-api directory:
+#   DATABASE_URL=postgresql://... python -m pytest tests
+import os
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, exc
+
+# Every list request builds its body, nothing is served from the cache
+os.environ.setdefault("RESPONSE_CACHE_SIZE", "0")
+# Operational endpoints are reachable with this token
+os.environ.setdefault("INTERNAL_API_TOKEN", "test-internal-token")
+
+import main  # noqa: E402
+from database import async_engine  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+PASSWORD = "test-password"
+
+
+@pytest.fixture(scope="session")
+def client():
+    try:
+        with TestClient(main.app) as client:
+            yield client
+    except exc.OperationalError as e:
+        pytest.skip(f"database at DATABASE_URL is not reachable: {e}")
+
+
+# Registers a fresh user and returns its auth headers
+@pytest.fixture
+def new_user(client):
+    def new_user():
+        username = f"t{uuid.uuid4().hex[:16]}"
+        response = client.post("/auth/register", json={
+            "username": username, "password": PASSWORD})
+        assert response.status_code == 201
+        response = client.post("/auth/token", data={
+            "username": username, "password": PASSWORD})
+        assert response.status_code == 200
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return new_user
+
+
+# Exercise ids of the catalog by goal type
+@pytest.fixture(scope="session")
+def exercises(client):
+    response = client.get("/exercise/sorted/exercise_goal_type")
+    assert response.status_code == 200
+    by_goal_type = {}
+    for exercise in response.json()["exercises"]:
+        by_goal_type.setdefault(exercise["goal_type_id"], []).append(
+            exercise["exercise_id"])
+    return by_goal_type
+
+
+# Counts the statements run through the app's engine inside the block
+@contextmanager
+def counting_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute",
+                     before_cursor_execute)
+
+
+@pytest.fixture
+def count_statements():
+    return counting_statements
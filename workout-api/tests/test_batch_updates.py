@@ -0,0 +1,55 @@
+def etag(client, headers, path):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return response.headers["etag"]
+
+
+def batch(client, headers, path, body):
+    response = client.post(path, json=body, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def unchanged(client, headers, path, tag):
+    response = client.get(path, headers=dict(headers, **{
+        "If-None-Match": tag}))
+    return response.status_code == 304
+
+
+# Updates repeating the stored values keep the collections, and every
+# client ETag, as they are
+def test_batch_updates_without_changes_keep_etags(
+        client, new_user, exercises):
+    headers = new_user()
+    goal_type_id, exercise_ids = next(iter(exercises.items()))
+    goal = {"goal_name": "goal", "range_min": 1, "range_max": 100,
+            "selected_exercises": exercise_ids[:2],
+            "goal_type_id": goal_type_id}
+    goal_id = batch(client, headers, "/goal/batch", {
+        "create": [goal]})["create"][0]["goal_id"]
+    schedule = {"goal_id": goal_id, "selected_exercises": exercise_ids[2:3],
+                "note": "session", "crontab_value": "0 7 * * 1"}
+    schedule_id = batch(client, headers, "/schedule/batch", {
+        "create": [schedule]})["create"][0]["schedule_id"]
+
+    goals = etag(client, headers, "/goal/personal_goals/")
+    schedules = etag(client, headers, "/schedule/user_schedules/")
+
+    result = batch(client, headers, "/goal/batch", {
+        "update": [dict(goal, goal_id=goal_id)]})
+    assert result["update"][0]["status"] == 200
+    result = batch(client, headers, "/schedule/batch", {
+        "update": [dict(schedule, schedule_id=schedule_id)]})
+    assert result["update"][0]["status"] == 200
+    assert unchanged(client, headers, "/goal/personal_goals/", goals)
+    assert unchanged(client, headers, "/schedule/user_schedules/", schedules)
+
+    batch(client, headers, "/schedule/batch", {
+        "update": [dict(schedule, schedule_id=schedule_id, note="moved")]})
+    assert unchanged(client, headers, "/goal/personal_goals/", goals)
+    assert not unchanged(
+        client, headers, "/schedule/user_schedules/", schedules)
+
+    batch(client, headers, "/goal/batch", {
+        "update": [dict(goal, goal_id=goal_id, goal_name="renamed")]})
+    assert not unchanged(client, headers, "/goal/personal_goals/", goals)
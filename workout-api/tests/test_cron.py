@@ -0,0 +1,201 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import (
+    CronError, merge_occurrences, parse_cron, schedule_occurrences,
+)
+
+
+# Reference expander: tests every minute of the window against the
+# fields, written without the compiled tables of services.cron
+NAMES = {
+    3: ["jan", "feb", "mar", "apr", "may", "jun",
+        "jul", "aug", "sep", "oct", "nov", "dec"],
+    4: ["sun", "mon", "tue", "wed", "thu", "fri", "sat"],
+}
+BOUNDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def reference_value(text, index):
+    names = NAMES.get(index, [])
+    if text.lower() in names:
+        return names.index(text.lower()) + (1 if index == 3 else 0)
+    return int(text)
+
+
+def reference_field(text, index):
+    lowest, highest = BOUNDS[index]
+    values = set()
+    for part in text.split(","):
+        part, _, step = part.partition("/")
+        step = int(step or 1)
+        if part == "*":
+            first, last = lowest, highest
+        elif "-" in part:
+            first, last = (reference_value(value, index)
+                           for value in part.split("-"))
+        else:
+            first = reference_value(part, index)
+            last = highest if step > 1 else first
+        values.update(v for v in range(first, last + 1)
+                      if (v - first) % step == 0)
+    if index == 4 and 7 in values:
+        values.add(0)
+    return values
+
+
+def reference_occurrences(expression, start, end):
+    fields = expression.split()
+    minutes, hours, days, months, weekdays = (
+        reference_field(text, index) for index, text in enumerate(fields))
+    day_restricted = fields[2][0] != "*"
+    weekday_restricted = fields[4][0] != "*"
+
+    when = start.replace(second=0, microsecond=0)
+    if when < start:
+        when += timedelta(minutes=1)
+    while when < end:
+        day_match = when.day in days
+        weekday_match = int(when.strftime("%w")) in weekdays
+        if day_restricted and weekday_restricted:
+            day_ok = day_match or weekday_match
+        else:
+            day_ok = ((day_match or not day_restricted)
+                      and (weekday_match or not weekday_restricted))
+        if (when.minute in minutes and when.hour in hours
+                and when.month in months and day_ok):
+            yield when
+        when += timedelta(minutes=1)
+
+
+EXPRESSIONS = [
+    "* * * * *",
+    "*/7 * * * *",
+    "5/15 */5 * * *",
+    "0,30 9-17 * * mon-fri",
+    "15 3 1,15 * *",
+    # Both day fields restricted: either one matches
+    "0 12 13 * fri",
+    "0 0 29 2 *",
+    "0 0 30 2 1",
+    "0 0 31 2 *",
+    "30 6 * feb,mar sun",
+    "0 0 * * 7",
+    # Stepped star does not restrict the day
+    "0 8 */2 * mon",
+    "0 8 1-31/10 jan-dec/2 *",
+    "59 23 31 * *",
+]
+
+WINDOWS = [
+    # Leap february and the month boundaries around it
+    (datetime(2024, 1, 27, 0, 0), datetime(2024, 3, 3, 0, 0)),
+    # Starts mid minute, ends mid day, crosses a year
+    (datetime(2023, 12, 30, 22, 14, 31), datetime(2024, 1, 2, 13, 40)),
+]
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+@pytest.mark.parametrize("window", WINDOWS)
+def test_matches_reference_expander(expression, window):
+    start, end = window
+    assert list(parse_cron(expression).occurrences(start, end)) == \
+        list(reference_occurrences(expression, start, end))
+
+
+def test_month_skip_reaches_sparse_months():
+    start, end = datetime(2023, 1, 1), datetime(2025, 1, 1)
+    assert list(parse_cron("0 0 29 2 *").occurrences(start, end)) == \
+        [datetime(2024, 2, 29)]
+    assert list(parse_cron("0 6 * dec 1").occurrences(start, end))[0] == \
+        datetime(2023, 12, 4, 6)
+
+
+def test_impossible_expression_yields_nothing():
+    expression = parse_cron("0 0 31 2,4,6 *")
+    assert not expression.possible
+    assert list(expression.occurrences(
+        datetime(2000, 1, 1), datetime(2100, 1, 1))) == []
+
+
+def test_macros_and_whitespace():
+    assert parse_cron("@DAILY").times == [(0, 0)]
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 8)
+    assert list(parse_cron("@weekly").occurrences(start, end)) == \
+        [datetime(2024, 1, 7)]
+    assert parse_cron("  0   0 * *  0 ") is parse_cron("0 0 * * 0")
+
+
+@pytest.mark.parametrize("expression", [
+    "",
+    "* * * *",
+    "* * * * * *",
+    "60 * * * *",
+    "* 24 * * *",
+    "* * 0 * *",
+    "* * 32 * *",
+    "* * * 13 *",
+    "* * * * 8",
+    "*/0 * * * *",
+    "*/x * * * *",
+    "5-1 * * * *",
+    "1,,2 * * * *",
+    "foo * * * *",
+    "* * * * mon-",
+    "* * * jan-foo *",
+    "@fortnightly",
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(CronError):
+        parse_cron(expression)
+
+
+def test_window_ending_at_datetime_max():
+    start = datetime.max - timedelta(minutes=3)
+    assert list(parse_cron("* * * * *").occurrences(
+        start, datetime.max)) == [
+        datetime(9999, 12, 31, 23, 57),
+        datetime(9999, 12, 31, 23, 58),
+        datetime(9999, 12, 31, 23, 59),
+    ]
+    # No whole minute is left after the start
+    assert list(parse_cron("* * * * *").occurrences(
+        datetime.max, datetime.max)) == []
+    # Skipping past december of the last year stops instead of
+    # overflowing
+    assert list(parse_cron("0 0 1 jan *").occurrences(
+        datetime(9999, 6, 1), datetime.max)) == []
+    assert list(parse_cron("0 0 31 dec *").occurrences(
+        datetime(9999, 6, 1), datetime.max)) == [datetime(9999, 12, 31)]
+
+
+def test_schedule_occurrences_clips_to_schedule_dates():
+    window_start = datetime(2024, 3, 1, tzinfo=timezone(timedelta(hours=2)))
+    window_end = datetime(2024, 3, 10, tzinfo=timezone.utc)
+    occurrences = schedule_occurrences(
+        "0 0 * * *", datetime(2024, 3, 3, 12), datetime(2024, 3, 6),
+        window_start, window_end)
+    # The end date itself is included
+    assert list(occurrences) == [
+        datetime(2024, 3, 4), datetime(2024, 3, 5), datetime(2024, 3, 6)]
+    occurrences = schedule_occurrences(
+        "0 12 * * *", None, None, window_start, window_end)
+    # Aware bounds are compared in utc, 00:00+02:00 is 22:00 the day before
+    assert next(occurrences) == datetime(2024, 2, 29, 22) + \
+        timedelta(hours=14)
+
+
+def test_merge_orders_by_time_then_key():
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 1, 1)
+    merged = merge_occurrences([
+        (2, parse_cron("*/20 * * * *").occurrences(start, end)),
+        (1, parse_cron("*/30 * * * *").occurrences(start, end)),
+    ])
+    assert list(merged) == [
+        (datetime(2024, 1, 1, 0, 0), 1),
+        (datetime(2024, 1, 1, 0, 0), 2),
+        (datetime(2024, 1, 1, 0, 20), 2),
+        (datetime(2024, 1, 1, 0, 30), 1),
+        (datetime(2024, 1, 1, 0, 40), 2),
+    ]
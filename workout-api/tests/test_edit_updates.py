@@ -0,0 +1,50 @@
+def revalidate(client, headers, path, tag):
+    response = client.get(path, headers=dict(headers, **{
+        "If-None-Match": tag}))
+    return response.status_code
+
+
+# Re-saving an unchanged goal or schedule keeps the collection ETags
+def test_unchanged_edits_keep_etags(client, new_user, exercises):
+    headers = new_user()
+    goal_type_id, exercise_ids = next(iter(exercises.items()))
+    goal = {"goal_name": "goal", "range_min": 1, "range_max": 100,
+            "selected_exercises": exercise_ids[:2],
+            "goal_type_id": goal_type_id}
+    assert client.post("/goal/create_goal/", json=goal,
+                       headers=headers).status_code == 200
+    response = client.get("/goal/personal_goals/", headers=headers)
+    goal_id = response.json()["user_goals"][0]["goal_id"]
+    goals = response.headers["etag"]
+
+    schedule = {"goal_id": goal_id, "selected_exercises": exercise_ids[2:3],
+                "note": "session", "crontab_value": "0 7 * * 1"}
+    assert client.post("/schedule/create_schedule", json=schedule,
+                       headers=headers).status_code == 200
+    response = client.get("/schedule/user_schedules/", headers=headers)
+    schedule_id = response.json()["schedules"][0]["schedule_id"]
+    schedules = response.headers["etag"]
+
+    response = client.put(f"/goal/personal_goals/{goal_id}", json=goal,
+                          headers=headers)
+    assert response.status_code == 200
+    assert response.json()["goal_name"] == "goal"
+    response = client.put(f"/schedule/user_schedules/{schedule_id}",
+                          json=schedule, headers=headers)
+    assert response.status_code == 200
+    assert revalidate(client, headers, "/goal/personal_goals/", goals) == 304
+    assert revalidate(
+        client, headers, "/schedule/user_schedules/", schedules) == 304
+
+    response = client.put(f"/schedule/user_schedules/{schedule_id}",
+                          json=dict(schedule, note="moved"), headers=headers)
+    assert response.json()["note"] == "moved"
+    assert revalidate(client, headers, "/goal/personal_goals/", goals) == 304
+    assert revalidate(
+        client, headers, "/schedule/user_schedules/", schedules) == 200
+
+    response = client.put(f"/goal/personal_goals/{goal_id}",
+                          json=dict(goal, goal_name="renamed"),
+                          headers=headers)
+    assert response.json()["goal_name"] == "renamed"
+    assert revalidate(client, headers, "/goal/personal_goals/", goals) == 200
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+
+def goal(goal_type_id, exercise_ids):
+    now = datetime.utcnow()
+    return {
+        "goal_name": "goal",
+        "start_date": (now - timedelta(days=30)).isoformat(),
+        "end_date": (now + timedelta(days=30)).isoformat(),
+        "range_min": 1,
+        "range_max": 100,
+        "selected_exercises": exercise_ids,
+        "goal_type_id": goal_type_id,
+    }
+
+
+def create_goals(client, headers, goals):
+    response = client.post("/goal/batch", json={"create": goals},
+                           headers=headers)
+    assert response.status_code == 200
+    assert all(item["status"] == 201 for item in response.json()["create"])
+
+
+def personal_goals(client, headers, count_statements):
+    with count_statements() as statements:
+        response = client.get("/goal/personal_goals/", headers=headers)
+    assert response.status_code == 200
+    return response.json()["user_goals"], len(statements)
+
+
+# Exercises, units, goal types and progress are loaded in bulk, so the
+# list costs the same number of statements for any number of goals
+def test_personal_goals_query_count_is_constant(
+        client, new_user, exercises, count_statements):
+    goal_type_id, exercise_ids = next(iter(exercises.items()))
+    few = new_user()
+    create_goals(client, few, [goal(goal_type_id, exercise_ids[:1])])
+
+    many = new_user()
+    create_goals(client, many, [
+        goal(goal_type_id, ids)
+        for _ in range(10)
+        for goal_type_id, ids in exercises.items()
+    ])
+
+    few_goals, few_statements = personal_goals(
+        client, few, count_statements)
+    many_goals, many_statements = personal_goals(
+        client, many, count_statements)
+    assert len(few_goals) == 1
+    assert len(many_goals) == 10 * len(exercises)
+    assert sum(len(g["selected_exercises"]) for g in many_goals) > \
+        len(many_goals)
+    assert many_statements == few_statements
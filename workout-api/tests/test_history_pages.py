@@ -0,0 +1,49 @@
+import orjson
+
+
+def add_history(client, headers, count):
+    for bmi in range(20, 20 + count):
+        response = client.post(f"/history/add_bmi_history/{bmi}",
+                               headers=headers)
+        assert response.status_code == 200
+
+
+def read_pages(client, headers, **params):
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, limit=2)
+        if cursor is not None:
+            query["cursor"] = cursor
+        response = client.get("/history/", params=query, headers=headers)
+        assert response.status_code == 200
+        pages.append([row["bmi_calculation"] for row in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return pages
+
+
+# The first page holds the latest rows, order=oldest walks forward
+def test_history_pages_newest_first(client, new_user):
+    headers = new_user()
+    add_history(client, headers, 5)
+
+    response = client.get("/history/", headers=headers)
+    assert [row["bmi_calculation"] for row in response.json()] == \
+        [24, 23, 22, 21, 20]
+    assert read_pages(client, headers) == [[24, 23], [22, 21], [20]]
+    assert read_pages(client, headers, order="oldest") == \
+        [[20, 21], [22, 23], [24]]
+
+    # The next link keeps the order of the page it follows
+    response = client.get("/history/", params={
+        "limit": 2, "order": "oldest"}, headers=headers)
+    assert "order=oldest" in response.headers["link"]
+
+    response = client.get("/history/", params={"limit": 2},
+                          headers=headers)
+    response = client.get("/history/", params={
+        "format": "ndjson", "cursor": response.headers["x-next-cursor"]},
+        headers=headers)
+    assert [orjson.loads(line)["bmi_calculation"]
+            for line in response.text.splitlines()] == [22, 21, 20]
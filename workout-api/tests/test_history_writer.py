@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime
+
+from services import HistoryWriter, history_writer
+
+
+# Session whose insert takes a while, rows count once committed
+class SlowSession:
+    def __init__(self, committed):
+        self.committed = committed
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, rows):
+        await asyncio.sleep(0.05)
+        self.pending.extend(rows)
+
+    async def commit(self):
+        self.committed.extend(self.pending)
+
+
+def row(user_id):
+    return dict(user_id=user_id, created=datetime.utcnow(),
+                fullname_change=None, weight_change=None,
+                height_change=None, bmi_calculation=None)
+
+
+def slow_sessions(monkeypatch):
+    committed = []
+    monkeypatch.setattr(history_writer, "AsyncSessionLocal",
+                        lambda: SlowSession(committed))
+    return committed
+
+
+def test_close_finishes_the_running_flush(monkeypatch):
+    committed = slow_sessions(monkeypatch)
+    writer = HistoryWriter(size=2, interval=60)
+
+    async def scenario():
+        writer.start()
+        writer.add(row(1))
+        writer.add(row(2))
+        # The full buffer wakes the task, its flush is now in progress
+        await asyncio.sleep(0.01)
+        writer.add(row(3))
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert [r["user_id"] for r in committed] == [1, 2, 3]
+    stats = writer.stats()
+    assert stats["buffered"] == 0
+    assert stats["written"] == 3
+    assert stats["failures"] == 0
+
+
+def test_cancelled_flush_keeps_its_rows(monkeypatch):
+    committed = slow_sessions(monkeypatch)
+    writer = HistoryWriter(size=10, interval=60)
+
+    async def scenario():
+        writer.add(row(1))
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0.01)
+        writer.add(row(2))
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert committed == []
+    assert [r["user_id"] for r in writer.rows] == [1, 2]
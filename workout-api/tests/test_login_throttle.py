@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services import LoginThrottle, MemoryCounters, login_throttle
+
+
+# Replaces the module's time so every attempt happens at a chosen second
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(0.0)
+    monkeypatch.setattr(login_throttle, "time", clock)
+    return clock
+
+
+def attempt(throttle, **values):
+    try:
+        asyncio.run(throttle.check(**values))
+    except HTTPException as e:
+        return e
+    return None
+
+
+def hit(counters, keys, index):
+    return asyncio.run(counters.hit(keys, index, 60))
+
+
+def test_rejects_past_the_limit_within_a_window(clock):
+    throttle = LoginThrottle(MemoryCounters(100), 60, {"username": 3})
+    clock.now = 600.0
+    for _ in range(3):
+        assert attempt(throttle, username="alice") is None
+    clock.now = 620.0
+    rejected = attempt(throttle, username="alice")
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "40"
+    # Other keys have their own counts
+    assert attempt(throttle, username="bob") is None
+    assert throttle.stats()["allowed"] == 4
+    assert throttle.stats()["rejected"] == 1
+
+
+def test_previous_window_weighs_by_its_overlap(clock):
+    throttle = LoginThrottle(MemoryCounters(100), 60, {"username": 5})
+    clock.now = 650.0
+    for _ in range(4):
+        assert attempt(throttle, username="alice") is None
+    # 15s into the next window: 4 * 0.75 + current
+    clock.now = 675.0
+    assert attempt(throttle, username="alice") is None
+    assert attempt(throttle, username="alice") is None
+    rejected = attempt(throttle, username="alice")
+    assert rejected is not None
+    assert rejected.headers["Retry-After"] == "45"
+    # 45s into the window the previous one only weighs 4 * 0.25 = 1,
+    # plus the 3 attempts of this window, including the rejected one
+    clock.now = 705.0
+    assert attempt(throttle, username="alice") is None
+    assert attempt(throttle, username="alice") is not None
+
+
+def test_counts_reset_after_an_idle_window(clock):
+    throttle = LoginThrottle(MemoryCounters(100), 60, {"username": 2})
+    clock.now = 600.0
+    attempt(throttle, username="alice")
+    attempt(throttle, username="alice")
+    assert attempt(throttle, username="alice") is not None
+    # Two windows later the old attempts no longer count at all
+    clock.now = 720.0
+    assert attempt(throttle, username="alice") is None
+    assert attempt(throttle, username="alice") is None
+
+
+def test_memory_counters_roll_over_windows():
+    counters = MemoryCounters(100)
+    assert hit(counters, ["a"], 10) == [(0, 1)]
+    assert hit(counters, ["a"], 10) == [(0, 2)]
+    assert hit(counters, ["a"], 11) == [(2, 1)]
+    assert hit(counters, ["a"], 11) == [(2, 2)]
+    # A gap of more than one window drops the previous count
+    assert hit(counters, ["a"], 13) == [(0, 1)]
+
+
+def test_memory_counters_evict_least_recently_used():
+    counters = MemoryCounters(2)
+    hit(counters, ["a"], 10)
+    hit(counters, ["b"], 10)
+    hit(counters, ["a"], 10)
+    hit(counters, ["c"], 10)
+    assert list(counters.entries) == ["a", "c"]
+    assert counters.stats() == {"keys": 2}
+    # An evicted key starts counting again
+    assert hit(counters, ["b"], 10) == [(0, 1)]
+
+
+def test_only_limited_and_given_kinds_are_counted(clock):
+    counters = MemoryCounters(100)
+    throttle = LoginThrottle(counters, 60, {"username": 2, "ip": 0})
+    assert throttle.stats()["limits"] == {"username": 2}
+    attempt(throttle, username="alice", ip="10.0.0.1")
+    attempt(throttle, username=None, ip="10.0.0.1")
+    assert list(counters.entries) == ["username:alice"]
+
+
+class FailingCounters(MemoryCounters):
+    async def hit(self, keys, index, window):
+        raise ConnectionError("counters unavailable")
+
+
+def test_counter_failures_let_attempts_through(clock):
+    throttle = LoginThrottle(FailingCounters(100), 60, {"username": 1})
+    for _ in range(3):
+        assert attempt(throttle, username="alice") is None
+    stats = throttle.stats()
+    assert stats["errors"] == 3
+    assert stats["rejected"] == 0
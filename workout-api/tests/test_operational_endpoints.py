@@ -0,0 +1,14 @@
+import pytest
+
+from config import INTERNAL_API_TOKEN
+
+
+# Operational endpoints answer 404 unless the internal token is sent
+@pytest.mark.parametrize("path", ["/metrics", "/internal/db_pool"])
+def test_operational_endpoints_need_the_internal_token(client, path):
+    assert client.get(path).status_code == 404
+    assert client.get(path, headers={
+        "X-Internal-Token": "wrong"}).status_code == 404
+    response = client.get(path, headers={
+        "X-Internal-Token": INTERNAL_API_TOKEN})
+    assert response.status_code == 200
@@ -0,0 +1,52 @@
+import asyncio
+import sys
+
+import services  # noqa: F401
+
+# services.response_cache is the cache instance re-exported by the package
+MemoryBackend = sys.modules["services.response_cache"].MemoryBackend
+
+
+def fill(backend, items):
+    async def scenario():
+        for key, value in items:
+            await backend.set(key, value)
+    asyncio.run(scenario())
+
+
+def test_evicts_oldest_entries_past_the_byte_limit():
+    backend = MemoryBackend(max_size=100, max_bytes=10)
+    fill(backend, [("a", b"1234"), ("b", b"1234")])
+    assert asyncio.run(backend.get("a")) == b"1234"
+    fill(backend, [("c", b"1234")])
+    # "a" was read last, so "b" is the least recently used one
+    assert list(backend.entries) == ["a", "c"]
+    assert backend.stats()["bytes"] == 8
+    assert backend.stats()["evictions"] == 1
+
+
+def test_replacing_and_deleting_keep_the_byte_count():
+    backend = MemoryBackend(max_size=100, max_bytes=100)
+    fill(backend, [("a", b"12345678"), ("a", b"12"), ("b", b"123")])
+    assert backend.stats()["bytes"] == 5
+    asyncio.run(backend.delete(["a", "missing"]))
+    assert backend.stats()["bytes"] == 3
+    asyncio.run(backend.close())
+    assert backend.stats()["bytes"] == 0
+
+
+def test_oversized_body_is_not_kept():
+    backend = MemoryBackend(max_size=100, max_bytes=10)
+    fill(backend, [("a", b"123"), ("b", b"12"), ("a", b"x" * 11)])
+    # The old body of "a" is dropped too, the rest stays cached
+    assert list(backend.entries) == ["b"]
+    stats = backend.stats()
+    assert stats["bytes"] == 2
+    assert stats["oversized"] == 1
+    assert stats["evictions"] == 0
+
+
+def test_entry_limit_still_applies():
+    backend = MemoryBackend(max_size=2, max_bytes=100)
+    fill(backend, [("a", b"1"), ("b", b"1"), ("c", b"1")])
+    assert list(backend.entries) == ["b", "c"]
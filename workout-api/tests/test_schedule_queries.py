@@ -0,0 +1,52 @@
+def create_goals(client, headers, exercises, count):
+    goals = [
+        {"goal_name": "goal", "range_min": 1, "range_max": 100,
+         "selected_exercises": ids, "goal_type_id": goal_type_id}
+        for _ in range(count)
+        for goal_type_id, ids in exercises.items()
+    ][:count]
+    response = client.post("/goal/batch", json={"create": goals},
+                           headers=headers)
+    assert response.status_code == 200
+    return [item["goal_id"] for item in response.json()["create"]]
+
+
+def create_schedules(client, headers, goal_ids, count):
+    schedules = [
+        {"goal_id": goal_ids[index % len(goal_ids)],
+         "selected_exercises": [], "note": f"session {index}",
+         "crontab_value": "0 7 * * 1,3,5"}
+        for index in range(count)
+    ]
+    response = client.post("/schedule/batch", json={"create": schedules},
+                           headers=headers)
+    assert response.status_code == 200
+    assert all(item["status"] == 201 for item in response.json()["create"])
+
+
+def user_schedules(client, headers, count_statements):
+    with count_statements() as statements:
+        response = client.get("/schedule/user_schedules/", headers=headers)
+    assert response.status_code == 200
+    return response.json()["schedules"], len(statements)
+
+
+# Goals are joined into the schedule query, so the list costs the same
+# number of statements for any number of schedules and goals
+def test_user_schedules_query_count_is_constant(
+        client, new_user, exercises, count_statements):
+    few = new_user()
+    create_schedules(client, few, create_goals(client, few, exercises, 1), 1)
+
+    many = new_user()
+    create_schedules(
+        client, many, create_goals(client, many, exercises, 30), 60)
+
+    few_schedules, few_statements = user_schedules(
+        client, few, count_statements)
+    many_schedules, many_statements = user_schedules(
+        client, many, count_statements)
+    assert len(few_schedules) == 1
+    assert len(many_schedules) == 60
+    assert len({s["goal_id"] for s in many_schedules}) == 30
+    assert many_statements == few_statements
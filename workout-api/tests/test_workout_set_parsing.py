@@ -0,0 +1,71 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from starlette.requests import Request
+
+from config import WORKOUT_SET_BATCH_MAX
+from routes.workout_set_routes import read_workout_sets
+
+
+SET = {"exercise_id": 1, "value_1": 3, "value_2": 10, "weight": 20.5}
+
+
+# Request whose body arrives in chunks of `size` bytes
+def request(body, media_type, size=7):
+    chunks = [body[i:i + size] for i in range(0, len(body), size)] or [b""]
+    messages = [
+        {"type": "http.request", "body": chunk,
+         "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({
+        "type": "http", "method": "POST", "path": "/workout_sets/batch",
+        "headers": [(b"content-type", media_type.encode())],
+    }, receive)
+
+
+def read(body, media_type, size=7):
+    return asyncio.run(read_workout_sets(request(body, media_type, size)))
+
+
+def ndjson(*items):
+    return b"\n".join(orjson.dumps(item) for item in items)
+
+
+def error_locations(body, media_type):
+    with pytest.raises(RequestValidationError) as error:
+        read(body, media_type)
+    return [tuple(e["loc"][:2]) for e in error.value.errors()]
+
+
+def test_json_and_ndjson_give_the_same_sets():
+    from_json = read(orjson.dumps([SET, SET]), "application/json")
+    from_ndjson = read(ndjson(SET, SET) + b"\n", "application/x-ndjson")
+    assert [i for i, _ in from_json] == [i for i, _ in from_ndjson] == [0, 1]
+    assert from_json[1][1] == from_ndjson[1][1]
+
+
+def test_null_items_are_rejected_at_their_index():
+    assert error_locations(orjson.dumps([SET, None]),
+                           "application/json") == [("body", 1)]
+    assert error_locations(ndjson(SET, None, SET),
+                           "application/x-ndjson") == [("body", 1)]
+
+
+def test_undecodable_ndjson_lines_are_reported():
+    body = ndjson(SET) + b"\n{broken\n" + ndjson(SET)
+    assert error_locations(body, "application/x-ndjson") == [("body", 1)]
+
+
+def test_unterminated_last_line_counts_towards_the_limit():
+    body = ndjson(*[SET] * (WORKOUT_SET_BATCH_MAX + 1))
+    with pytest.raises(HTTPException) as error:
+        read(body, "application/x-ndjson", size=4096)
+    assert error.value.status_code == 413